@@ -1,68 +1,442 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template
+from flask import Flask, abort, request, jsonify, send_file, render_template
+from werkzeug.security import safe_join
+import argparse
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
 
-app = Flask(__name__, static_folder='static', template_folder='templates')
+import datastore
+from thumbnails import build_webp_variants, webp_variant_path
+
+# 关闭 Flask 自带的 static 路由，/static 由下面带缓存头的 static_files 处理
+app = Flask(__name__, static_folder=None, template_folder='templates')
+STATIC_DIR = os.path.join(app.root_path, 'static')
+# 爬虫 --data-db 直写时，图片列指向爬虫的下载目录
+IMAGE_DIR = os.path.abspath(os.environ.get('XC8866_IMAGE_DIR', 'images'))
+# 图片按内容哈希生成强 ETag，浏览器在 max-age 内不再请求，过期后用 If-None-Match 校验（未变返回 304）
+IMAGE_MAX_AGE = int(os.environ.get('XC8866_IMAGE_MAX_AGE', str(30 * 24 * 3600)))
+# 设为 1 时，浏览器支持 WebP 且已用 --build-webp 生成过对应文件，就返回 WebP 版本
+SERVE_WEBP = os.environ.get('XC8866_WEBP', '0') == '1'
+HASH_CACHE_ENTRIES = 65536
+
+DATABASE = os.environ.get('XC8866_DB', 'data.db')
+POOL_SIZE = int(os.environ.get('XC8866_DB_POOL', '8'))
+CACHE_ENTRIES = int(os.environ.get('XC8866_CACHE_ENTRIES', '256'))
+CACHE_BYTES = int(os.environ.get('XC8866_CACHE_BYTES', str(32 * 1024 * 1024)))
+CACHE_CHECK_INTERVAL = float(os.environ.get('XC8866_CACHE_CHECK_INTERVAL', '1.0'))
+
+LIST_COLUMNS = (
+    'title', 'price', 'qq', 'wechat', 'phone', 'post_link',
+    'image1', 'image2', 'image3', 'image4',
+    'original1', 'original2', 'original3', 'original4',
+)
+SORT_ORDERS = {
+    '': 'rowid',
+    'price_asc': 'price ASC, rowid ASC',
+    'price_desc': 'price DESC, rowid DESC',
+}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# /api/export 每次从游标取多少行，内存占用只和这个值有关，与导出总行数无关
+EXPORT_BATCH = 500
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+class ReadConnection(sqlite3.Connection):
+    # 缓存按 schema 版本计算的列信息，导入脚本重建表后自动失效
+    schema_version = None
+    columns = ''
+    fts = False
+
+    def refresh_schema(self):
+        version = self.execute("PRAGMA schema_version").fetchone()[0]
+        if version != self.schema_version:
+            self.columns = select_columns(self)
+            self.fts = datastore.has_fts(self)
+            self.schema_version = version
+
+
+class ReadOnlyPool:
+    # 复用只读连接：省去每次请求的打开、解析 schema 和冷缓存开销，语句缓存也跨请求保留
+    def __init__(self, path, size):
+        self.path = path
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def connect(self):
+        uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, factory=ReadConnection, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        conn.execute("PRAGMA cache_size = -65536")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        # 只有正常用完的连接才放回池里；查询出错或流式响应被客户端中断（GeneratorExit）时
+        # 可能还留着没读完的游标，直接关闭，不会泄漏也不会把旧快照交给下一个请求
+        reusable = False
+        try:
+            conn.refresh_schema()
+            yield conn
+            reusable = True
+        finally:
+            if reusable:
+                try:
+                    self.idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            else:
+                conn.close()
+
+
+class QueryCache:
+    # 按 (规范化查询参数) 缓存序列化好的 JSON；数据库 generation 变化时整体失效
+    def __init__(self, max_entries, max_bytes, check_interval):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.entries = OrderedDict()
+        self.size = 0
+        self.generation = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def sync_generation(self):
+        # 最多每 check_interval 秒读一次 generation，期间命中缓存完全不碰 SQLite
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return self.generation
+        with pool.connection() as conn:
+            generation = datastore.read_generation(conn)
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.size = 0
+                self.generation = generation
+            self.checked_at = now
+        return generation
+
+    def get(self, key):
+        # 返回 (缓存的正文或 None, 检查时的 generation)，未命中时把 generation 原样交给 put
+        generation = self.sync_generation()
+        if generation is None:
+            return None, None
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body, generation
+
+    def put(self, key, generation, body):
+        if generation is None or len(body) > self.max_bytes:
+            return
+        with self.lock:
+            # 查询期间有写入提交、generation 已经变了：结果可能来自旧数据，不缓存
+            if generation != self.generation:
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class ContentHashCache:
+    # 文件内容的 sha256，按 (路径, 大小, 修改时间) 缓存，文件被替换后自动重新计算
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            digest = self.entries.get(key)
+            if digest is not None:
+                self.entries.move_to_end(key)
+                return digest
+        sha = hashlib.sha256()
+        with open(path, 'rb') as file:
+            while chunk := file.read(1024 * 1024):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with self.lock:
+            self.entries[key] = digest
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return digest
+
+
+pool = ReadOnlyPool(DATABASE, POOL_SIZE)
+query_cache = QueryCache(CACHE_ENTRIES, CACHE_BYTES, CACHE_CHECK_INTERVAL)
+hash_cache = ContentHashCache(HASH_CACHE_ENTRIES)
+
+
+def json_response(payload):
+    return app.response_class(app.json.dumps(payload) + "\n", mimetype='application/json')
+
+
+def select_columns(conn):
+    # 只取页面需要的列；旧库缺少的图片列用 NULL 补齐
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(data)")}
+    columns = ["rowid AS id"]
+    for column in LIST_COLUMNS:
+        columns.append(column if column in existing else f"NULL AS {column}")
+    return ", ".join(columns)
+
+
+def encode_cursor(sort, row):
+    key = [row['price'], row['id']] if sort in ('price_asc', 'price_desc') else [row['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(sort, cursor):
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if sort in ('price_asc', 'price_desc'):
+        price, rowid = key
+        return (None if price is None else float(price)), int(rowid)
+    (rowid,) = key
+    return None, int(rowid)
+
+
+def price_conditions(price_min, price_max):
+    # 返回 (条件, 参数, 规范化后的最低价, 最高价)，价格不是数字时抛出 ValueError
+    conditions = []
+    params = []
+    price_min_val = price_max_val = None
+
+    if price_min:
+        price_min_val = float(price_min)
+        conditions.append("price >= ?")
+        params.append(price_min_val)
+
+    if price_max:
+        price_max_val = float(price_max)
+        conditions.append("price <= ?")
+        params.append(price_max_val)
+
+    return conditions, params, price_min_val, price_max_val
+
+
+def keyword_condition(conn, global_q):
+    match = datastore.fts_query(global_q)
+    if match and conn.fts:
+        # 全文索引覆盖 标题/价格/QQ/微信/手机，结果与下面的 LIKE 子串匹配一致
+        return "rowid IN (SELECT rowid FROM data_fts WHERE data_fts MATCH ?)", [match]
+    like = f"%{global_q}%"
+    return """
+        (
+          title LIKE ? OR
+          CAST(price AS TEXT) LIKE ? OR
+          qq LIKE ? OR
+          wechat LIKE ? OR
+          phone LIKE ?
+        )
+    """, [like] * 5
+
+
+def keyset_condition(sort, price, rowid):
+    # 按 (排序键, rowid) 做游标分页；SQLite 升序时 NULL 在前，降序时 NULL 在后
+    if sort == 'price_asc':
+        if price is None:
+            return "((price IS NULL AND rowid > ?) OR price IS NOT NULL)", [rowid]
+        return "(price > ? OR (price = ? AND rowid > ?))", [price, price, rowid]
+    if sort == 'price_desc':
+        if price is None:
+            return "(price IS NULL AND rowid < ?)", [rowid]
+        return "(price < ? OR (price = ? AND rowid < ?) OR price IS NULL)", [price, price, rowid]
+    return "rowid > ?", [rowid]
+
+
 @app.route('/api/data')
 def api_data():
     price_min = request.args.get('price_min', '').strip()
     price_max = request.args.get('price_max', '').strip()
     global_q = request.args.get('global', '').strip()
+    sort = request.args.get('sort', '').strip()
+    cursor_arg = request.args.get('cursor', '').strip()
+    empty = {'rows': [], 'next_cursor': None}
 
-    sql = "SELECT * FROM data"
-    conditions = []
-    params = []
+    if sort not in SORT_ORDERS:
+        sort = ''
 
-    if global_q:
-        like = f"%{global_q}%"
-        conditions.append("""
-            (
-              title LIKE ? OR
-              CAST(price AS TEXT) LIKE ? OR
-              qq LIKE ? OR
-              wechat LIKE ? OR
-              phone LIKE ?
-            )
-        """)
-        params.extend([like] * 5)
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
 
-    if price_min:
+    if not (global_q or price_min or price_max):
+        # 防止全表返回
+        return jsonify(empty)
+
+    try:
+        conditions, params, price_min_val, price_max_val = price_conditions(price_min, price_max)
+    except ValueError:
+        return jsonify(empty)
+
+    if cursor_arg:
         try:
-            price_min_val = float(price_min)
-            conditions.append("price >= ?")
-            params.append(price_min_val)
-        except ValueError:
-            return jsonify([])
+            condition, cursor_params = keyset_condition(sort, *decode_cursor(sort, cursor_arg))
+        except (ValueError, TypeError):
+            return jsonify(empty)
+        conditions.append(condition)
+        params.extend(cursor_params)
 
-    if price_max:
+    cache_key = (global_q, price_min_val, price_max_val, sort, limit, cursor_arg)
+    body, generation = query_cache.get(cache_key)
+    if body is not None:
+        return app.response_class(body, mimetype='application/json')
+
+    with pool.connection() as conn:
+        if global_q:
+            condition, keyword_params = keyword_condition(conn, global_q)
+            conditions.append(condition)
+            params.extend(keyword_params)
+
+        sql = f"SELECT {conn.columns} FROM data WHERE {' AND '.join(conditions)} ORDER BY {SORT_ORDERS[sort]} LIMIT ?"
+        params.append(limit + 1)
+
+        rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    # 多取一行判断是否还有下一页
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1])
+
+    response = json_response({'rows': rows, 'next_cursor': next_cursor})
+    query_cache.put(cache_key, generation, response.get_data())
+    return response
+
+def csv_text(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def export_text(fmt, rows):
+    # 把一批行编码成 NDJSON 或 CSV 文本
+    if fmt == 'ndjson':
+        return "".join(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in rows)
+    return csv_text(tuple(row) for row in rows)
+
+
+def export_stream(fmt, use_gzip, conditions, params, global_q, sort):
+    # 生成器在响应发送过程中逐批读取游标，连接在导出结束后归还连接池，客户端中途断开时关闭
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+
+    def emit(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    with pool.connection() as conn:
+        if global_q:
+            condition, keyword_params = keyword_condition(conn, global_q)
+            conditions = conditions + [condition]
+            params = params + keyword_params
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = conn.execute(f"SELECT {conn.columns} FROM data {where} ORDER BY {SORT_ORDERS[sort]}", params)
         try:
-            price_max_val = float(price_max)
-            conditions.append("price <= ?")
-            params.append(price_max_val)
-        except ValueError:
-            return jsonify([])
-
-    if conditions:
-        sql += " WHERE " + " AND ".join(conditions)
-    else:
-        # 防止全表返回
-        return jsonify([])
+            if fmt == 'csv':
+                # 带 BOM，Excel 直接打开不乱码
+                yield emit('\ufeff' + csv_text([[column[0] for column in cursor.description]]))
+            while rows := cursor.fetchmany(EXPORT_BATCH):
+                yield emit(export_text(fmt, rows))
+        finally:
+            cursor.close()
+    if compressor:
+        yield compressor.flush()
+
+
+@app.route('/api/export')
+def api_export():
+    # 流式导出查询结果：筛选条件与 /api/data 相同，但允许不带条件导出全部数据
+    fmt = request.args.get('format', 'ndjson').strip()
+    sort = request.args.get('sort', '').strip()
+    global_q = request.args.get('global', '').strip()
+    use_gzip = request.args.get('gzip', '') in ('1', 'true')
 
-    conn = sqlite3.connect('data.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    rows = cursor.execute(sql, params).fetchall()
-    conn.close()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format 只支持 {', '.join(EXPORT_FORMATS)}"}), 400
+    if sort not in SORT_ORDERS:
+        sort = ''
+    try:
+        conditions, params, _, _ = price_conditions(
+            request.args.get('price_min', '').strip(), request.args.get('price_max', '').strip()
+        )
+    except ValueError:
+        return jsonify({'error': "价格必须是数字"}), 400
 
-    return jsonify([dict(row) for row in rows])
+    filename = f"export.{fmt}" + (".gz" if use_gzip else "")
+    response = app.response_class(
+        export_stream(fmt, use_gzip, conditions, params, global_q, sort),
+        mimetype='application/gzip' if use_gzip else EXPORT_FORMATS[fmt],
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def cached_file(directory, filename):
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    if SERVE_WEBP:
+        variant = str(webp_variant_path(Path(directory), filename))
+        # 只看请求里是否明确声明支持 image/webp，*/* 不算
+        if 'image/webp' in request.headers.get('Accept', '') and os.path.isfile(variant):
+            path = variant
+
+    # send_file 处理 If-None-Match / If-Modified-Since，未变化时返回不带正文的 304
+    response = send_file(path, etag=hash_cache.get(path), max_age=IMAGE_MAX_AGE, conditional=True)
+    if SERVE_WEBP:
+        response.vary.add('Accept')
+    return response
 
 @app.route('/static/<path:filename>')
 def static_files(filename):
-    return send_from_directory(app.static_folder, filename)
+    return cached_file(STATIC_DIR, filename)
 
-if __name__ == '__main__':
+@app.route('/images/<path:filename>')
+def crawled_images(filename):
+    return cached_file(IMAGE_DIR, filename)
+
+def main():
+    parser = argparse.ArgumentParser(description="启动查询网页")
+    parser.add_argument('--build-webp', action='store_true', help="不启动网页，为 static 和图片目录中的图片预先生成 WebP 版本后退出")
+    parser.add_argument('--webp-quality', type=int, default=80, help="WebP 质量，默认 80")
+    args = parser.parse_args()
+
+    if args.build_webp:
+        for directory in (STATIC_DIR, IMAGE_DIR):
+            if os.path.isdir(directory):
+                count = build_webp_variants(directory, args.webp_quality)
+                print(f"✅ {directory}：已生成 {count} 个 WebP 文件")
+        return
     app.run(debug=True)
+
+if __name__ == '__main__':
+    main()
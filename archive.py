@@ -0,0 +1,128 @@
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时退回 zlib
+    zstandard = None
+
+CODEC_SUFFIXES = {"zstd": ".zst", "zlib": ".zz"}
+SUFFIX_CODECS = {suffix: codec for codec, suffix in CODEC_SUFFIXES.items()}
+# 单个段文件写满后换新段，方便按段并行读取和清理
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("归档使用 zstd 压缩，请先 pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def read_frame(segment_path: str, offset: int, size: int) -> bytes:
+    # 每条记录是独立压缩的一帧，可在任意进程中按偏移单独读取
+    codec = SUFFIX_CODECS[Path(segment_path).suffix]
+    with open(segment_path, "rb") as file:
+        file.seek(offset)
+        return decompress(file.read(size), codec)
+
+
+@dataclass(slots=True)
+class ArchivedPage:
+    url: str
+    segment_path: str
+    offset: int
+    size: int
+
+
+class RawArchive:
+    # 帖子原始 HTML 的只追加归档：<root>/seg-000001.zst 等段文件 + index.db（URL → 段、偏移、长度）。
+    # 同一 URL 重新归档时只更新索引指向最新一帧，内容未变（crc32 与长度相同）则不重复写入
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.codec = "zstd" if zstandard is not None else "zlib"
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.root / "index.db", check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                raw_size INTEGER,
+                crc32 INTEGER,
+                archived_at TEXT
+            )
+            """
+        )
+        self.conn.commit()
+        self.segment: Path | None = None
+        self.file = None
+
+    def open_segment(self) -> None:
+        # 总是新开一个段，不往旧段（可能是另一种压缩格式）里追加
+        if self.file is not None:
+            self.file.close()
+        existing = sorted(self.root.glob("seg-*"))
+        number = int(existing[-1].name[4:10]) + 1 if existing else 1
+        self.segment = self.root / f"seg-{number:06d}{CODEC_SUFFIXES[self.codec]}"
+        self.file = self.segment.open("ab")
+
+    def append(self, url: str, content: bytes) -> None:
+        crc = zlib.crc32(content)
+        with self.lock:
+            row = self.conn.execute("SELECT raw_size, crc32 FROM pages WHERE url = ?", (url,)).fetchone()
+            if row == (len(content), crc):
+                return
+
+            if self.file is None or self.file.tell() >= SEGMENT_SIZE:
+                self.open_segment()
+            frame = compress(content, self.codec)
+            offset = self.file.tell()
+            self.file.write(frame)
+            self.file.flush()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, segment, offset, size, raw_size, crc32, archived_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, self.segment.name, offset, len(frame), len(content), crc, datetime.now().isoformat(timespec="seconds")),
+            )
+            self.conn.commit()
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def iter_pages(self) -> Iterator[ArchivedPage]:
+        # 按段和偏移顺序读取，磁盘访问是顺序的
+        conn = sqlite3.connect(self.root / "index.db")
+        try:
+            for url, segment, offset, size in conn.execute(
+                "SELECT url, segment, offset, size FROM pages ORDER BY segment, offset"
+            ):
+                yield ArchivedPage(url, str(self.root / segment), offset, size)
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.conn.close()
@@ -0,0 +1,275 @@
+import asyncio
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+import aiohttp
+
+from frontier import PageFrontier
+from image_store import CHUNK_SIZE
+from main import DEFAULT_HEADERS, FETCH_STAGES, XC8866Crawler
+from metrics import METRICS, logger
+from records import ParsedPost, PostRecord
+from transport import count_connections, count_requests, pool_for
+
+RETRY_EXCEPTIONS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+def trace_connections(pool: str) -> aiohttp.TraceConfig:
+    # 与线程版一样统计新建连接数，复用数 = 请求数 - 新建连接数
+    async def on_connection_create_end(session, context, params) -> None:
+        count_connections(pool).inc()
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_end.append(on_connection_create_end)
+    return trace
+
+
+# 单事件循环抓取引擎：列表页、帖子页、图片分别用独立的信号量限制并发
+class AsyncCrawlEngine:
+    def __init__(self, crawler: XC8866Crawler) -> None:
+        self.crawler = crawler
+        self.config = crawler.config
+        self.log = crawler.log
+
+        self.page_slots = asyncio.Semaphore(self.config.page_concurrency)
+        self.post_slots = asyncio.Semaphore(self.config.post_concurrency)
+        self.image_slots = asyncio.Semaphore(self.config.image_concurrency)
+
+        self.batch: list[tuple[str, PostRecord]] = []
+        self.image_tasks: dict[str, asyncio.Task] = {}
+        self.flush_lock = asyncio.Lock()
+        self.frontier_settled = asyncio.Condition()
+
+    def run(self) -> None:
+        asyncio.run(self._run())
+
+    async def _run(self) -> None:
+        frontier = self.crawler.page_frontier(self.config.page_concurrency)
+
+        connect_timeout, read_timeout = self.config.request_timeout
+        timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        # 页面和图片 CDN 各用一个连接池，连接上限分别等于对应的并发数
+        limits = {"page": self.config.page_concurrency + self.config.post_concurrency, "image": self.config.image_concurrency}
+
+        async with AsyncExitStack() as stack:
+            self.sessions = {
+                pool: await stack.enter_async_context(
+                    aiohttp.ClientSession(
+                        headers=DEFAULT_HEADERS,
+                        timeout=timeout,
+                        connector=aiohttp.TCPConnector(limit=limit),
+                        trace_configs=[trace_connections(pool)],
+                    )
+                )
+                for pool, limit in limits.items()
+            }
+            # page_concurrency 个协程依次从边界领取列表页，增量模式下可以提前停止
+            results = await asyncio.gather(
+                *(self.page_worker(frontier) for _ in range(self.config.page_concurrency)),
+                return_exceptions=True,
+            )
+
+        for result in results:
+            if isinstance(result, BaseException):
+                self.log(f"❌ 列表页协程异常: {result}")
+
+        await self.flush(force=True)
+        self.log("✅ 所有任务完成，程序退出")
+
+    async def fetch(self, url: str, url_class: str) -> bytes:
+        with METRICS.stage(FETCH_STAGES[url_class]):
+            content = await self._fetch(url, url_class)
+        METRICS.counter("crawler_bytes_total", "下载的页面字节数", kind=url_class).inc(len(content))
+        return content
+
+    async def _fetch(self, url: str, url_class: str) -> bytes:
+        cache = self.crawler.http_cache
+        if cache is None:
+            _, body = await self.request(url, url_class, aiohttp.ClientResponse.read)
+            return body
+
+        # 缓存的读写要解压/压缩正文并提交 SQLite，放到线程里执行，避免卡住事件循环
+        entry, headers = await asyncio.to_thread(cache.prepare, url, url_class)
+        if entry is not None and entry.fresh:
+            return entry.body
+
+        response, body = await self.request(url, url_class, aiohttp.ClientResponse.read, headers)
+        return await asyncio.to_thread(cache.resolve, url, url_class, entry, response.status, body, response.headers)
+
+    async def request(self, url: str, url_class: str, read, headers: dict[str, str] | None = None):
+        # 与线程版传输层共用同一个重试策略：经过令牌桶限速，超时、断连和 429/5xx 按指数退避加抖动重试。
+        # read 在响应上下文内读取正文，读取中断也会整体重试，返回 (response, read 的结果)
+        pool = pool_for(url_class)
+        limiter = self.crawler.rate_limiter
+        retry = self.crawler.transport.retry
+        attempt = 0
+        while True:
+            await limiter.acquire_async(url)
+            count_requests(pool).inc()
+            retry_after = None
+            try:
+                async with self.sessions[pool].get(url, headers=headers) as response:
+                    limiter.observe(url, response.status, response.headers.get("Retry-After"))
+                    if not retry.should_retry(attempt, response.status):
+                        response.raise_for_status()
+                        return response, await read(response)
+                    error = f"HTTP {response.status}"
+                    retry_after = response.headers.get("Retry-After")
+            except RETRY_EXCEPTIONS as exc:
+                if not retry.should_retry(attempt):
+                    raise
+                error = str(exc) or type(exc).__name__
+
+            attempt += 1
+            await asyncio.sleep(retry.delay(attempt, url, url_class, error, retry_after))
+
+    async def next_page(self, frontier: PageFrontier) -> tuple[int, str] | None:
+        # 窗口已满时在协程里等待其他页结算，不让 next_page 阻塞事件循环
+        async with self.frontier_settled:
+            await self.frontier_settled.wait_for(frontier.ready)
+        return frontier.next_page()
+
+    async def page_worker(self, frontier: PageFrontier) -> None:
+        while (page := await self.next_page(frontier)) is not None:
+            page_num, page_url = page
+            new_posts = None
+            try:
+                new_posts = await self.crawl_page(page_url, page_num)
+            except Exception as exc:  # noqa: BLE001
+                # 单页出错只记录日志，协程继续领取下一页，不让一页的异常停掉整个列表页工作者
+                self.log(f"❌ 第 {page_num} 页处理异常: {exc}")
+            finally:
+                frontier.report(page_num, new_posts)
+                async with self.frontier_settled:
+                    self.frontier_settled.notify_all()
+
+    async def crawl_page(self, page_url: str, page_num: int) -> int | None:
+        # 返回本页新占位的帖子数，页面抓取失败返回 None
+        async with self.page_slots:
+            self.log(f"📄 协程爬取第 {page_num} 页：{page_url}")
+            try:
+                content = await self.fetch(page_url, "listing")
+            except Exception as exc:  # noqa: BLE001
+                self.log(f"爬取页面失败: {page_url} 错误: {exc}")
+                return None
+
+        # 解析 HTML 是 CPU 密集的同步操作，放到线程里执行，避免卡住其他协程
+        links = await asyncio.to_thread(self.crawler.extract_post_links, content)
+        if not links:
+            self.log(f"⚠️ 第 {page_num} 页没有获取到帖子链接，跳过")
+            return 0
+
+        self.log(f"🔍 本页共发现 {len(links)} 条帖子链接")
+        tasks = []
+        for link in links:
+            post_id = self.crawler.build_post_id(link)
+            post_url = self.crawler.build_post_url(link)
+            # 主键查询很快，直接在事件循环里占位，同一帖子出现在多个列表页也只抓一次
+            if not self.crawler.state.claim(post_id, post_url):
+                logger.debug("跳过已爬取帖子 %s (%s)", post_id, link)
+                continue
+            tasks.append(self.crawl_post(post_id, post_url))
+
+        await asyncio.gather(*tasks)
+        self.log(f"✅ 第 {page_num} 页爬取完成")
+        return len(tasks)
+
+    async def crawl_post(self, post_id: str, post_url: str) -> None:
+        async with self.post_slots:
+            self.log(f"➡️ 正在爬取帖子: {post_url}")
+            try:
+                content = await self.fetch(post_url, "post")
+            except Exception as exc:  # noqa: BLE001
+                self.log(f"访问帖子失败: {post_url} 错误: {exc}")
+                self.crawler.state.mark_failed(post_id, str(exc))
+                return
+
+        try:
+            parsed = await asyncio.to_thread(self.archive_and_parse, post_url, content)
+        except Exception as exc:  # noqa: BLE001
+            self.log(f"⚠️ 帖子解析失败，跳过: {post_url} 错误: {exc}")
+            self.crawler.state.mark_failed(post_id, str(exc))
+            return
+
+        image_dir = self.crawler.build_post_image_dir(post_url)
+        results = await asyncio.gather(
+            *(
+                self.download_image(img_url, image_dir / self.crawler.build_image_name(index, img_url))
+                for index, img_url in enumerate(parsed.image_urls, start=1)
+            )
+        )
+        record = parsed.to_record([path for path in results if path])
+
+        self.log(f"  标题: {record.title}")
+        self.log(f"  下载图片 {len(record.image_files)} 张")
+
+        self.batch.append((post_id, record))
+        await self.flush()
+
+    def archive_and_parse(self, post_url: str, content: bytes) -> ParsedPost:
+        # 在线程里执行：归档要压缩原始 HTML 并提交索引库，解析是 CPU 密集操作
+        self.crawler.archive_post(post_url, content)
+        return self.crawler.parse_post_html(content, post_url)
+
+    async def download_image(self, img_url: str, image_path: Path) -> str | None:
+        with METRICS.stage("image_download"):
+            return await self._download_image(img_url, image_path)
+
+    async def _download_image(self, img_url: str, image_path: Path) -> str | None:
+        images = "crawler_images_total"
+        if image_path.exists():
+            logger.debug("  跳过已存在图片: %s", image_path.name)
+            METRICS.counter(images, "处理的图片数", result="existing").inc()
+            return str(image_path)
+
+        store = self.crawler.image_store
+        object_path = store.lookup(img_url)
+        if object_path:
+            logger.debug("  复用已下载图片: %s", image_path.name)
+            METRICS.counter(images, "处理的图片数", result="reused").inc()
+        else:
+            # 同一 URL 只下载一次，其他帖子等待同一个任务
+            task = self.image_tasks.get(img_url)
+            if task is None:
+                task = asyncio.create_task(self.fetch_image_object(img_url))
+                self.image_tasks[img_url] = task
+            try:
+                object_path = await task
+            except Exception as exc:  # noqa: BLE001
+                self.log(f"图片下载失败: {img_url}, 错误: {exc}")
+                return None
+            finally:
+                self.image_tasks.pop(img_url, None)
+            logger.debug("  下载图片: %s", image_path.name)
+            METRICS.counter(images, "处理的图片数", result="downloaded").inc()
+
+        store.link(object_path, image_path)
+        return str(image_path)
+
+    async def fetch_image_object(self, img_url: str) -> Path:
+        async def read(response: aiohttp.ClientResponse):
+            # 每次尝试都写到新的临时文件，中途断开重试时不会拼接出残缺图片
+            pending = self.crawler.image_store.begin()
+            try:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    pending.write(chunk)
+            except BaseException:
+                pending.abort()
+                raise
+            return pending
+
+        async with self.image_slots:
+            _, pending = await self.request(img_url, "image", read)
+            return pending.commit(img_url)
+
+    async def flush(self, force: bool = False) -> None:
+        if not self.batch or (not force and len(self.batch) < self.config.flush_batch):
+            return
+
+        async with self.flush_lock:
+            records, self.batch = self.batch, []
+            if not records:
+                return
+            # 写 Excel 是阻塞操作，放到线程里执行，避免卡住事件循环
+            await asyncio.to_thread(self.crawler.save_posts, records)
+            self.log(f"✅ 已保存 {len(records)} 条帖子数据")
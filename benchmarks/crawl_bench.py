@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+from benchmarks.fixture_server import add_site_arguments, site_from_args, start_server
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，峰值内存显示为 n/a
+    resource = None
+
+# 端到端爬虫基准：python -m benchmarks.crawl_bench --engine thread async pipeline
+# 父进程启动本地测试站点，每个引擎在独立子进程里完整运行一次 XC8866Crawler.crawl，
+# 这样峰值内存和 CPU 时间互不干扰，也不包含测试站点自身的开销
+
+STAGES = {
+    "fetch": ("fetch",),
+    "parse": ("parse_post_html", "extract_post_links"),
+    "image": ("download_image",),
+    "write": ("save_records",),
+    "export": ("export_results",),
+}
+
+
+class StageTimer:
+    # 按线程统计各阶段的 CPU 时间（time.thread_time），嵌套调用只计入最内层阶段
+    def __init__(self) -> None:
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.cpu: dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self.calls: dict[str, int] = {stage: 0 for stage in STAGES}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            self.cpu[stage] += seconds
+
+    def wrap(self, stage: str, fn):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            stack = self.local.__dict__.setdefault("stack", [])
+            now = time.thread_time()
+            if stack:
+                self.add(stack[-1], now - self.local.mark)
+            stack.append(stage)
+            self.local.mark = now
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                now = time.thread_time()
+                self.add(stack.pop(), now - self.local.mark)
+                self.local.mark = now
+                with self.lock:
+                    self.calls[stage] += 1
+
+        return timed
+
+    def instrument(self, crawler) -> None:
+        for stage, names in STAGES.items():
+            for name in names:
+                setattr(crawler, name, self.wrap(stage, getattr(crawler, name)))
+
+
+def peak_rss_mb(who) -> float | None:
+    if resource is None:
+        return None
+    # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def run_child(args: argparse.Namespace) -> dict:
+    from main import CrawlConfig, XC8866Crawler
+
+    workdir = Path(tempfile.mkdtemp(prefix=f"crawl_bench_{args.engine[0]}_"))
+    config = CrawlConfig(
+        start_url=args.start_url,
+        total_pages=args.pages,
+        threads=args.threads,
+        output_xlsx=str(workdir / "output.xlsx"),
+        image_dir=str(workdir / "images"),
+        crawled_file=str(workdir / "crawled_posts.txt"),
+        state_db=str(workdir / "crawl_state.db"),
+        store_path=str(workdir / "results.db"),
+        export_excel=not args.no_export,
+        rate=args.rate,
+        burst=args.burst,
+        engine=args.engine[0],
+        page_concurrency=args.page_concurrency,
+        post_concurrency=args.post_concurrency,
+        image_concurrency=args.image_concurrency,
+        parser=args.parser,
+        parse_workers=args.parse_workers,
+    )
+
+    timer = StageTimer()
+    cpu_start = os.times()
+    wall_start = time.perf_counter()
+    crawler = XC8866Crawler(config)
+    timer.instrument(crawler)
+    crawler.log = lambda msg: None
+    crawler.crawl()
+    wall = time.perf_counter() - wall_start
+    cpu_end = os.times()
+
+    conn = sqlite3.connect(workdir / "results.db")
+    posts, images = conn.execute("SELECT COUNT(*), COALESCE(SUM(image_count), 0) FROM results").fetchone()
+    conn.close()
+
+    own_cpu = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    child_cpu = (cpu_end.children_user - cpu_start.children_user) + (cpu_end.children_system - cpu_start.children_system)
+    return {
+        "engine": config.engine,
+        "wall": wall,
+        "posts": posts,
+        "images": images,
+        "cpu": own_cpu,
+        "child_cpu": child_cpu,
+        "stages": timer.cpu,
+        "calls": timer.calls,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "child_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "workdir": str(workdir),
+    }
+
+
+def format_mb(value: float | None) -> str:
+    return "n/a" if value is None else f"{value:.0f}"
+
+
+def format_stage(result: dict, name: str) -> str:
+    # 没有经过被包装方法的阶段显示 n/a 而不是 0：async 引擎的抓取和图片下载是协程方法，
+    # pipeline 引擎的解析在子进程里，这些 CPU 时间只计入 other 或 procs s
+    if not result["calls"][name]:
+        return "n/a"
+    return f"{result['stages'][name]:.2f}"
+
+
+def print_report(results: list[dict]) -> None:
+    stage_names = list(STAGES)
+    header = f"{'engine':<10}{'posts':>7}{'wall s':>8}{'posts/s':>9}{'MB/s':>7}{'cpu s':>7}{'procs s':>9}"
+    header += "".join(f"{name + ' s':>9}" for name in stage_names) + f"{'other s':>9}{'RSS MB':>8}{'procs MB':>10}"
+    print(header)
+    for result in results:
+        stages = result["stages"]
+        other = max(0.0, result["cpu"] - sum(stages.values()))
+        line = (
+            f"{result['engine']:<10}{result['posts']:>7}{result['wall']:>8.2f}"
+            f"{result['posts'] / result['wall']:>9.1f}{result['bytes'] / result['wall'] / 1e6:>7.1f}"
+            f"{result['cpu']:>7.2f}{result['child_cpu']:>9.2f}"
+        )
+        line += "".join(f"{format_stage(result, name):>9}" for name in stage_names)
+        line += f"{other:>9.2f}{format_mb(result['peak_rss_mb']):>8}{format_mb(result['child_peak_rss_mb']):>10}"
+        print(line)
+    print("cpu s：爬虫主进程 CPU；procs s：解析/缩略图子进程 CPU；各阶段为线程 CPU 时间，n/a 表示该引擎的这一阶段无法按线程计时；other 为未归入阶段的部分（协程调度、队列、n/a 阶段等）")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="端到端爬虫基准（本地测试站点）")
+    add_site_arguments(parser)
+    parser.add_argument("--engine", nargs="+", choices=("thread", "async", "pipeline"), default=["thread", "async", "pipeline"])
+    parser.add_argument("--url-shape", choices=("query", "forum"), default="query", help="列表页链接格式：?page=N 或 forum-23-N.htm")
+    parser.add_argument("--threads", type=int, default=6)
+    parser.add_argument("--page-concurrency", type=int, default=4)
+    parser.add_argument("--post-concurrency", type=int, default=16)
+    parser.add_argument("--image-concurrency", type=int, default=32)
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--parser", default="html.parser")
+    parser.add_argument("--rate", type=float, default=1000.0, help="令牌桶速率，默认 1000，避免限速成为瓶颈")
+    parser.add_argument("--burst", type=int, default=1000)
+    parser.add_argument("--no-export", action="store_true", help="不计入 Excel 导出阶段")
+    parser.add_argument("--json", type=str, default=None, help="把结果另存为 JSON 文件")
+    parser.add_argument("--start-url", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.start_url:
+        # 子进程：只跑一个引擎，结果以 JSON 输出到 stdout 最后一行
+        print(json.dumps(run_child(args)))
+        return
+
+    server = start_server(site_from_args(args))
+    host, port = server.server_address[:2]
+    start_url = (
+        f"http://{host}:{port}/topics/tag/193?page=1" if args.url_shape == "query" else f"http://{host}:{port}/forum-23-1.htm"
+    )
+    results = []
+    for engine in args.engine:
+        before = server.stats()
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.crawl_bench", *sys.argv[1:], "--engine", engine, "--start-url", start_url],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        after = server.stats()
+        result["bytes"] = after["bytes"] - before["bytes"]
+        result["requests"] = after["requests"] - before["requests"]
+        results.append(result)
+        print(f"✅ {engine}: {result['posts']} 个帖子，{result['requests']} 次请求，数据在 {result['workdir']}", file=sys.stderr)
+
+    print_report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import io
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image as PILImage
+
+# 本地测试站点：python -m benchmarks.fixture_server --port 8765
+# 按 build_page_urls 支持的两种列表页格式（?page=N 与 forum-23-N.htm）生成列表页、帖子页和图片，
+# 可配置延迟和错误率，供端到端基准和调试使用
+
+LISTING_QUERY = re.compile(r"^/topics/tag/\d+\?(?:.*&)?page=(\d+)")
+LISTING_FORUM = re.compile(r"^/forum-23-(\d+)\.htm$")
+POST_PATH = re.compile(r"^/thread-(\d+)\.htm$")
+IMAGE_PATH = re.compile(r"^/upload/([\w-]+)\.jpg$")
+
+
+@dataclass(slots=True)
+class FixtureSite:
+    pages: int = 20
+    posts_per_page: int = 20
+    floors: int = 30
+    depth: int = 8
+    images_per_post: int = 3
+    image_kb: int = 40
+    latency_ms: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 1
+
+
+def build_image(kb: int, seed: int) -> bytes:
+    # 随机噪点 JPEG，压不小，文件大小接近目标
+    rng = random.Random(seed)
+    side = max(16, int((kb * 1024 / 1.5) ** 0.5))
+    image = PILImage.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def build_listing_page(site: FixtureSite, page_num: int) -> bytes:
+    if page_num > site.pages:
+        return "<html><body><ul></ul></body></html>".encode()
+    start = (page_num - 1) * site.posts_per_page
+    items = "".join(
+        f'<li class="media thread tap" data-href="thread-{post_id}.htm"><span>帖子 {post_id}</span></li>'
+        for post_id in range(start + 1, start + site.posts_per_page + 1)
+    )
+    return f"<html><head><title>列表第{page_num}页</title></head><body><ul class='threads'>{items}</ul></body></html>".encode()
+
+
+def build_post_page(site: FixtureSite, post_id: int) -> bytes:
+    floors = []
+    for i in range(site.floors):
+        inner = f"<p>第{i}楼 这里是一段比较长的帖子正文，用来模拟真实页面的文本量。编号 {post_id}-{i}</p>"
+        for _ in range(site.depth):
+            inner = f"<div class='wrap'>{inner}</div>"
+        floors.append(f"<li class='floor'>{inner}</li>")
+    images = "".join(f"<img src='/upload/{post_id}-{k}.jpg'>" for k in range(site.images_per_post))
+    return (
+        f"<html><head><meta property='og:title' content='测试帖子 {post_id}'></head><body>"
+        "<div id='app'><img src='/upload/logo.jpg'><div class='main'><div class='content'>"
+        f"<table><tr><th>价格</th><td>{100 + post_id % 900}</td></tr><tr><th>QQ</th><td>{10000000 + post_id}</td></tr></table>"
+        f"<div class='photos'>{images}<img src='/upload/banner.jpg'></div>"
+        f"<ul>{''.join(floors)}</ul>"
+        f"<div class='contact'><div>微信：wx_{post_id:06d}</div><div>手机：138{post_id:08d}</div></div>"
+        "</div></div></div></body></html>"
+    ).encode()
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], site: FixtureSite) -> None:
+        super().__init__(address, FixtureHandler)
+        self.site = site
+        self.image = build_image(site.image_kb, site.seed)
+        self.rng = random.Random(site.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.errors = 0
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            failed = self.site.error_rate > 0 and self.rng.random() < self.site.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def count_bytes(self, size: int) -> None:
+        with self.lock:
+            self.bytes_sent += size
+
+    def handle_error(self, request, client_address) -> None:
+        # 客户端关闭空闲长连接时会出现连接重置，属于正常情况，不打印堆栈
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {"requests": self.requests, "bytes": self.bytes_sent, "errors": self.errors}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server: FixtureServer
+    # 所有响应都带 Content-Length，可以保持长连接，和真实站点一样测到连接复用
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:  # noqa: N802
+        site = self.server.site
+        if site.latency_ms:
+            time.sleep(site.latency_ms / 1000)
+        if self.server.should_fail():
+            self.send_body(503, b"busy", "text/plain", {"Retry-After": "0"})
+            return
+
+        if match := LISTING_QUERY.match(self.path) or LISTING_FORUM.match(self.path):
+            self.send_body(200, build_listing_page(site, int(match.group(1))), "text/html; charset=utf-8")
+        elif match := POST_PATH.match(self.path):
+            self.send_body(200, build_post_page(site, int(match.group(1))), "text/html; charset=utf-8")
+        elif match := IMAGE_PATH.match(self.path):
+            # JPEG 结束标记之后追加图片名，每张图内容不同但都能正常解码
+            self.send_body(200, self.server.image + match.group(1).encode(), "image/jpeg")
+        else:
+            self.send_body(404, b"not found", "text/plain")
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count_bytes(len(body))
+
+
+def start_server(site: FixtureSite, host: str = "127.0.0.1", port: int = 0) -> FixtureServer:
+    # port 为 0 时由系统分配空闲端口，实际地址见 server.server_address
+    server = FixtureServer((host, port), site)
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server
+
+
+def add_site_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--pages", type=int, default=20, help="列表页数量，默认 20")
+    parser.add_argument("--posts-per-page", type=int, default=20, help="每页帖子数，默认 20")
+    parser.add_argument("--floors", type=int, default=30, help="每个帖子的楼层数，默认 30")
+    parser.add_argument("--depth", type=int, default=8, help="每层楼 div 嵌套深度，默认 8")
+    parser.add_argument("--images-per-post", type=int, default=3, help="每个帖子的图片数（另有共用的横幅图），默认 3")
+    parser.add_argument("--image-kb", type=int, default=40, help="单张图片大约多少 KB，默认 40")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个请求的服务器延迟（毫秒），默认 0")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 503 的比例，默认 0")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子，默认 1")
+
+
+def site_from_args(args: argparse.Namespace) -> FixtureSite:
+    return FixtureSite(
+        pages=args.pages,
+        posts_per_page=args.posts_per_page,
+        floors=args.floors,
+        depth=args.depth,
+        images_per_post=args.images_per_post,
+        image_kb=args.image_kb,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地测试站点（列表页、帖子页、图片）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    server = FixtureServer((args.host, args.port), site_from_args(args))
+    print(f"测试站点已启动：http://{args.host}:{args.port}/topics/tag/193?page=1 或 /forum-23-1.htm")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import statistics
+import time
+
+import parsing
+
+# 帖子页解析微基准：python -m benchmarks.parse_bench
+# 生成楼层多、div 嵌套深的大页面，对比逐个候选元素 get_text（旧做法）与单次叶子文本扫描的耗时
+
+
+def build_post_page(floors: int, depth: int) -> bytes:
+    floor_html = []
+    for i in range(floors):
+        inner = f"<p>第{i}楼 这里是一段比较长的帖子正文，用来模拟真实页面的文本量。</p><img src='/upload/{i}.jpg'>"
+        for _ in range(depth):
+            inner = f"<div class='wrap'>{inner}</div>"
+        floor_html.append(f"<li class='floor'>{inner}</li>")
+    return (
+        "<html><head><meta property='og:title' content='测试帖子'></head><body>"
+        "<div id='app'><div class='main'><div class='content'>"
+        "<table><tr><th>价格</th><td>500</td></tr><tr><th>QQ</th><td>12345678</td></tr></table>"
+        f"<ul>{''.join(floor_html)}</ul>"
+        "<div class='contact'><div>微信：wx_test_01</div><div>手机：13800001111</div></div>"
+        "</div></div></div></body></html>"
+    ).encode()
+
+
+def legacy_item_scan(soup) -> None:
+    # 旧实现对 "dl dt, li, div" 的每个命中都调用一次 get_text，嵌套越深重复越多
+    for item in soup.select("dl dt, li, div"):
+        item.get_text(" ", strip=True)
+
+
+def measure(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="帖子页解析微基准")
+    parser.add_argument("--floors", type=int, nargs="+", default=[50, 200, 800], help="每页楼层数")
+    parser.add_argument("--depth", type=int, default=12, help="每层楼 div 嵌套深度")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取中位数")
+    parser.add_argument("--parser", choices=parsing.PARSERS, nargs="+", default=list(parsing.PARSERS))
+    args = parser.parse_args()
+
+    print(f"{'parser':<12}{'floors':>8}{'KB':>8}{'soup ms':>10}{'scan ms':>10}{'extract ms':>12}{'legacy items ms':>17}{'post ms':>10}")
+    for backend in args.parser:
+        for floors in args.floors:
+            content = build_post_page(floors, args.depth)
+            url = "https://xc8866.com/thread-1.htm"
+            soup = parsing.make_soup(content, backend)
+            scan = parsing.scan_page(soup)
+
+            soup_ms = measure(lambda: parsing.make_soup(content, backend), args.repeat)
+            scan_ms = measure(lambda: parsing.scan_page(soup), args.repeat)
+            extract_ms = measure(lambda: (parsing.extract_info(scan), parsing.extract_images(scan, url)), args.repeat)
+            legacy_ms = measure(lambda: legacy_item_scan(soup), args.repeat)
+            post_ms = measure(lambda: parsing.parse_post_html(content, url, backend), args.repeat)
+            print(
+                f"{backend:<12}{floors:>8}{len(content) // 1024:>8}{soup_ms:>10.1f}{scan_ms:>10.1f}"
+                f"{extract_ms:>12.1f}{legacy_ms:>17.1f}{post_ms:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
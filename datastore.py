@@ -0,0 +1,157 @@
+import sqlite3
+from pathlib import Path
+
+# app.py 查询用的 data 表；导入脚本和爬虫直写都通过这里维护同一份表结构
+# image1..4 是列表里显示的缩略图，original1..4 是放大查看时加载的原图（为空时退回 image 列）
+DATA_COLUMNS = (
+    "title", "price", "qq", "wechat", "phone", "post_link",
+    "image1", "image2", "image3", "image4",
+    "original1", "original2", "original3", "original4",
+)
+MAX_IMAGES = 4
+FTS_COLUMNS = ("title", "price", "qq", "wechat", "phone")
+# 全量导入先写入这张临时表，全部成功后才替换 data 表
+STAGING_TABLE = "data_import"
+
+
+def insert_sql(table: str) -> str:
+    return f"INSERT INTO {table} ({', '.join(DATA_COLUMNS)}) VALUES ({', '.join(':' + c for c in DATA_COLUMNS)})"
+
+
+INSERT_SQL = insert_sql("data")
+
+
+def connect(path: str | Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def create_table(conn: sqlite3.Connection, table: str) -> None:
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            title TEXT,
+            price REAL,
+            qq TEXT,
+            wechat TEXT,
+            phone TEXT,
+            post_link TEXT,
+            image1 TEXT,
+            image2 TEXT,
+            image3 TEXT,
+            image4 TEXT,
+            original1 TEXT,
+            original2 TEXT,
+            original3 TEXT,
+            original4 TEXT
+        )
+        """
+    )
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    create_table(conn, "data")
+    # 兼容 pandas 生成的旧表：补齐缺失的列
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(data)")}
+    for column in DATA_COLUMNS:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE data ADD COLUMN "{column}" TEXT')
+    # 每次写入都递增 generation，网页据此让查询缓存失效
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_data_post_link ON data(post_link)")
+    # 价格区间筛选走索引范围扫描
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_data_price ON data(price)")
+    ensure_fts(conn)
+    conn.commit()
+
+
+def has_fts(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_fts'").fetchone()
+    return row is not None
+
+
+def ensure_fts(conn: sqlite3.Connection) -> None:
+    # 全文索引用 trigram 分词（适合中文标题的子串搜索），由触发器与 data 表保持同步
+    created = not has_fts(conn)
+    columns = ", ".join(FTS_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in FTS_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in FTS_COLUMNS)
+    try:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS data_fts USING fts5("
+            f"{columns}, content='data', content_rowid='rowid', tokenize='trigram')"
+        )
+    except sqlite3.OperationalError:
+        # SQLite 过旧（无 FTS5 或 trigram），网页会退回 LIKE 查询
+        return
+
+    conn.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS data_fts_ai AFTER INSERT ON data BEGIN
+            INSERT INTO data_fts (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_fts_ad AFTER DELETE ON data BEGIN
+            INSERT INTO data_fts (data_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_fts_au AFTER UPDATE ON data BEGIN
+            INSERT INTO data_fts (data_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO data_fts (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END;
+        """
+    )
+    if created:
+        conn.execute("INSERT INTO data_fts (data_fts) VALUES ('rebuild')")
+
+
+def replace_data(conn: sqlite3.Connection, staging: str) -> None:
+    # 在调用方的事务中用临时表替换 data 表（索引和触发器随旧表一起删除，之后由 ensure_schema 重建）
+    conn.execute("DROP TABLE IF EXISTS data_fts")
+    conn.execute("DROP TABLE IF EXISTS data")
+    conn.execute(f"ALTER TABLE {staging} RENAME TO data")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta'").fetchone():
+        bump_generation(conn)
+
+
+def bump_generation(conn: sqlite3.Connection) -> None:
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+
+def read_generation(conn: sqlite3.Connection) -> int | None:
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def fts_query(text: str) -> str | None:
+    # trigram 至少需要 3 个字符；整体作为一个短语做子串匹配
+    if len(text) < 3:
+        return None
+    return '"' + text.replace('"', '""') + '"'
+
+
+def to_price(value) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
+
+
+def upsert_rows(conn: sqlite3.Connection, rows: list[dict]) -> None:
+    # 以 post_link 为键：已存在则更新，否则插入（旧表可能没有唯一约束，所以不用 ON CONFLICT）
+    update_sql = (
+        "UPDATE data SET "
+        + ", ".join(f"{column} = :{column}" for column in DATA_COLUMNS if column != "post_link")
+        + " WHERE post_link = :post_link"
+    )
+    with conn:
+        for row in rows:
+            if conn.execute(update_sql, row).rowcount == 0:
+                conn.execute(INSERT_SQL, row)
+        bump_generation(conn)
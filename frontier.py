@@ -0,0 +1,69 @@
+import threading
+from collections import deque
+from typing import Callable, Iterator
+
+
+# 列表页边界：页面按顺序懒生成，多个线程/协程从这里领取下一页。
+# 增量模式下按页码顺序统计，连续 stop_after 页没有新帖子（或抓取失败）就不再发放新页；
+# 已发出但未按顺序结算的页数不超过 window（即列表页并发数），前面一页很慢时后面的工作者等待，不会越跑越远
+class PageFrontier:
+    def __init__(
+        self,
+        pages: Iterator[tuple[int, str]],
+        stop_after: int | None = None,
+        log: Callable[[str], None] = print,
+        window: int = 1,
+    ) -> None:
+        self.pages = pages
+        self.stop_after = stop_after
+        self.log = log
+        self.window = max(1, window)
+        self.lock = threading.Lock()
+        self.settled = threading.Condition(self.lock)
+        self.stopped = False
+
+        # 已发出但尚未按顺序结算的页码，以及乱序完成的结果
+        self.issued: deque[int] = deque()
+        self.results: dict[int, int | None] = {}
+        self.empty_streak = 0
+
+    def ready(self) -> bool:
+        # 窗口未满或已经停止时，next_page 可以立即返回；协程先等到 ready 再领取，不阻塞事件循环
+        with self.lock:
+            return self._ready()
+
+    def _ready(self) -> bool:
+        return self.stopped or self.stop_after is None or len(self.issued) < self.window
+
+    def next_page(self) -> tuple[int, str] | None:
+        with self.settled:
+            self.settled.wait_for(self._ready)
+            if self.stopped:
+                return None
+            page = next(self.pages, None)
+            if page is None:
+                self.stopped = True
+                self.settled.notify_all()
+            elif self.stop_after is not None:
+                self.issued.append(page[0])
+            return page
+
+    def __iter__(self) -> Iterator[tuple[int, str]]:
+        while (page := self.next_page()) is not None:
+            yield page
+
+    def report(self, page_num: int, new_posts: int | None) -> None:
+        # new_posts 为本页新占位的帖子数；None 表示页面抓取失败，同样计入连续空页：
+        # 增量模式默认不限页数，翻过最后一页后的 404 或站点拒绝访问时也要能停下来
+        if self.stop_after is None:
+            return
+        with self.settled:
+            self.results[page_num] = new_posts
+            self.settled.notify_all()
+            while self.issued and self.issued[0] in self.results:
+                settled = self.issued.popleft()
+                result = self.results.pop(settled)
+                self.empty_streak = self.empty_streak + 1 if not result else 0
+                if self.empty_streak >= self.stop_after and not self.stopped:
+                    self.stopped = True
+                    self.log(f"⏹️ 截至第 {settled} 页已连续 {self.empty_streak} 页没有新帖子或抓取失败，停止领取新页")
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Mapping
+
+URL_CLASSES = ("listing", "post", "image")
+# 默认：列表页每次都带条件请求重新验证，帖子页一天内直接用缓存。
+# 图片正文由 ImageStore 按内容存放，image 的 TTL 控制 URL → 内容 的映射可信多久（None 为永久）
+DEFAULT_TTLS = {"listing": 0.0, "post": 86400.0, "image": None}
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+    fresh: bool = False
+
+
+class HttpCache:
+    # 磁盘 HTTP 缓存：按 URL 保存压缩后的响应体和 ETag / Last-Modified。
+    # 在 TTL 内直接返回缓存，过期后发条件请求，服务器返回 304 时沿用缓存内容
+    def __init__(self, path: str | Path, ttls: Mapping[str, float | None] | None = None) -> None:
+        self.path = Path(path)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                url_class TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB,
+                size INTEGER,
+                stored_at REAL
+            )
+            """
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def is_fresh(self, stored_at: float, url_class: str) -> bool:
+        # TTL 为 None 表示永不过期，0 表示每次都重新验证
+        ttl = self.ttls.get(url_class, 0.0)
+        return ttl is None or time.time() - stored_at < ttl
+
+    def prepare(self, url: str, url_class: str) -> tuple[CacheEntry | None, dict[str, str]]:
+        # 返回缓存条目（fresh 表示可直接使用）和需要附加的条件请求头
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None, {}
+
+        body, etag, last_modified, stored_at = row
+        entry = CacheEntry(zlib.decompress(body), etag, last_modified, stored_at)
+        entry.fresh = self.is_fresh(stored_at, url_class)
+
+        headers: dict[str, str] = {}
+        if entry.fresh:
+            with self.lock:
+                self.hits += 1
+        else:
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return entry, headers
+
+    def resolve(
+        self,
+        url: str,
+        url_class: str,
+        entry: CacheEntry | None,
+        status: int,
+        body: bytes,
+        headers: Mapping[str, str],
+    ) -> bytes:
+        # 处理网络响应：304 刷新缓存时间并返回缓存内容，200 写入缓存
+        if entry is not None and status == 304:
+            with self.lock:
+                self.conn.execute("UPDATE responses SET stored_at = ? WHERE url = ?", (time.time(), url))
+                self.conn.commit()
+                self.revalidated += 1
+            return entry.body
+
+        with self.lock:
+            self.misses += 1
+        if status == 200:
+            self.store(url, url_class, body, headers)
+        return body
+
+    def store(self, url: str, url_class: str, body: bytes, headers: Mapping[str, str]) -> None:
+        compressed = zlib.compress(body, 6)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (url, url_class, etag, last_modified, body, size, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, url_class, headers.get("ETag"), headers.get("Last-Modified"), compressed, len(body), time.time()),
+            )
+            self.conn.commit()
+
+    def summary(self) -> str:
+        with self.lock:
+            return f"HTTP 缓存：直接命中 {self.hits}，304 复用 {self.revalidated}，完整下载 {self.misses}"
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+CHUNK_SIZE = 64 * 1024
+
+
+class PendingObject:
+    # 边下载边计算哈希的临时文件，commit 后按内容哈希移动到对象目录
+    def __init__(self, store: "ImageStore") -> None:
+        self.store = store
+        fd, name = tempfile.mkstemp(dir=store.objects_dir, suffix=".part")
+        self.tmp_path = Path(name)
+        self.file = os.fdopen(fd, "wb")
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        if chunk:
+            self.file.write(chunk)
+            self.digest.update(chunk)
+            self.size += len(chunk)
+
+    def commit(self, url: str) -> Path:
+        self.file.close()
+        sha256 = self.digest.hexdigest()
+        object_path = self.store.object_path(sha256)
+        if object_path.exists():
+            # 同样内容已经存过（例如多个帖子共用的横幅图），丢弃这份
+            self.tmp_path.unlink(missing_ok=True)
+        else:
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            # mkstemp 创建的文件只有属主可读，改成普通图片文件的权限
+            os.chmod(self.tmp_path, 0o644)
+            os.replace(self.tmp_path, object_path)
+        self.store.remember(url, sha256, self.size)
+        return object_path
+
+    def abort(self) -> None:
+        self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class ImageStore:
+    # 图片按 sha256 内容寻址存放在 <root>/_objects，每个帖子目录里只放硬链接；
+    # URL → 哈希 的索引保证同一个 URL 永远只下载一次
+    def __init__(self, root: str | Path, max_age: float | None = None) -> None:
+        self.root = Path(root)
+        # URL 索引的有效期（秒），过期后重新下载；None 表示永久有效
+        self.max_age = max_age
+        self.objects_dir = self.root / "_objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.root / "_index.db", check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS url_index (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                size INTEGER,
+                fetched_at TEXT
+            )
+            """
+        )
+        self.conn.commit()
+
+        self.inflight: dict[str, threading.Event] = {}
+        self.inflight_lock = threading.Lock()
+
+    def object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256
+
+    def lookup(self, url: str) -> Path | None:
+        with self.lock:
+            row = self.conn.execute("SELECT sha256, fetched_at FROM url_index WHERE url = ?", (url,)).fetchone()
+        if not row:
+            return None
+        sha256, fetched_at = row
+        if self.max_age is not None and fetched_at:
+            if datetime.now() - datetime.fromisoformat(fetched_at) >= timedelta(seconds=self.max_age):
+                return None
+        object_path = self.object_path(sha256)
+        return object_path if object_path.exists() else None
+
+    def remember(self, url: str, sha256: str, size: int) -> None:
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO url_index (url, sha256, size, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, sha256, size, now),
+            )
+            self.conn.commit()
+
+    def begin(self) -> PendingObject:
+        return PendingObject(self)
+
+    def fetch(self, url: str, download) -> Path:
+        # 同一 URL 并发请求时只有一个线程真正下载，其余等待结果；
+        # download() 用 begin() 取得临时文件写入内容并返回它，失败时自行 abort
+        while True:
+            object_path = self.lookup(url)
+            if object_path:
+                return object_path
+
+            with self.inflight_lock:
+                event = self.inflight.get(url)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    self.inflight[url] = event
+
+            if not owner:
+                event.wait()
+                if self.lookup(url) is None:
+                    raise RuntimeError(f"图片下载失败（并发请求）: {url}")
+                continue
+
+            try:
+                return download().commit(url)
+            finally:
+                with self.inflight_lock:
+                    self.inflight.pop(url, None)
+                event.set()
+
+    @staticmethod
+    def link(object_path: Path, target_path: Path) -> None:
+        if target_path.exists():
+            return
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(object_path, target_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # 不支持硬链接的文件系统退回复制
+            shutil.copyfile(object_path, target_path)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -1,71 +1,280 @@
+import argparse
 import os
-import pandas as pd
-import sqlite3
-import openpyxl
-from openpyxl.utils import get_column_letter
+import posixpath
+import re
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import iterparse
 
-excel_file = 'output.xlsx'
-output_dir = 'static/images'
-os.makedirs(output_dir, exist_ok=True)
-
-# 读取Excel数据
-df = pd.read_excel(excel_file)
+import datastore
 
 # 规范列名（中文转英文，方便后续处理）
-df.rename(columns={
+COLUMN_MAP = {
     '标题': 'title',
     '价格': 'price',
     'QQ': 'qq',
     '微信': 'wechat',
     '手机': 'phone',
-    '帖子链接': 'post_link'
-}, inplace=True)
-
-# 加载openpyxl，读取嵌入图片
-wb = openpyxl.load_workbook(excel_file)
-ws = wb.active
-
-# 映射：行号 -> 图片列表 (cell, image_obj)
-image_map = {}
-for image in ws._images:
-    if not hasattr(image, 'anchor') or not hasattr(image.anchor, '_from'):
-        continue
-    anchor = image.anchor._from
-    row = anchor.row + 1  # 行号，从1开始
-    cell = f"{get_column_letter(anchor.col + 1)}{row}"
-    image_map.setdefault(row, []).append((cell, image))
-
-# 新增图片字段，初始化为空
-df['image1'] = ''
-df['image2'] = ''
-df['image3'] = ''
-
-for idx, row in df.iterrows():
-    title = str(row['title']).strip()
+    '帖子链接': 'post_link',
+}
+
+# 每批写入 SQLite 的行数；一批内的图片复制完成后才写入，内存占用与工作簿大小无关。
+# 整个导入是一个事务，中途失败时回滚，库里的数据保持导入前的样子
+IMPORT_BATCH = 500
+COPY_WORKERS = 8
+
+NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PKG = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+NS_XDR = '{http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing}'
+NS_A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def iter_elements(source, *tags):
+    # 流式遍历 XML：处理完的元素随即从父节点清除，几 GB 的工作表也不会在内存里留下整棵树
+    stack = []
+    for event, elem in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag in tags:
+            yield elem
+            if stack:
+                stack[-1].clear()
+
+
+def column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def part_path(base, target):
+    # 关系文件里的目标路径相对于所属部件所在目录，也可能是以 / 开头的包内绝对路径
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def read_rels(zf, part):
+    rels_name = posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+    try:
+        source = zf.open(rels_name)
+    except KeyError:
+        return {}
+    rels = {}
+    with source:
+        for elem in iter_elements(source, f'{NS_PKG}Relationship'):
+            if elem.get('TargetMode') != 'External':
+                rels[elem.get('Id')] = (elem.get('Type', '').rsplit('/', 1)[-1], part_path(part, elem.get('Target')))
+    return rels
+
+
+def active_sheet_path(zf):
+    # 与 openpyxl 的 wb.active 一致：workbook.xml 中 activeTab 指向的工作表，默认第一个
+    active = 0
+    sheet_ids = []
+    with zf.open('xl/workbook.xml') as source:
+        for elem in iter_elements(source, f'{NS_MAIN}workbookView', f'{NS_MAIN}sheet'):
+            if elem.tag == f'{NS_MAIN}workbookView':
+                active = int(elem.get('activeTab', 0))
+            else:
+                sheet_ids.append(elem.get(f'{NS_REL}id'))
+    return read_rels(zf, 'xl/workbook.xml')[sheet_ids[active]][1]
+
+
+def read_shared_strings(zf):
+    try:
+        source = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    with source:
+        # 富文本由多段 <r><t> 组成，拼接全部文字
+        return [''.join(t.text or '' for t in elem.iter(f'{NS_MAIN}t')) for elem in iter_elements(source, f'{NS_MAIN}si')]
+
+
+def cell_value(cell, shared_strings):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{NS_MAIN}t'))
+    value = cell.findtext(f'{NS_MAIN}v')
+    if value is None:
+        return None
+    if kind == 's':
+        return shared_strings[int(value)]
+    if kind == 'b':
+        return str(value == '1')
+    return value
+
+
+def iter_sheet(zf, sheet_path, shared_strings):
+    # 流式读取工作表：返回 (Excel 行号, {列序号: 文本})，读完一行就释放
+    with zf.open(sheet_path) as source:
+        for row_num, elem in enumerate(iter_elements(source, f'{NS_MAIN}row'), start=1):
+            values = {}
+            for position, cell in enumerate(elem.iter(f'{NS_MAIN}c')):
+                match = CELL_REF.match(cell.get('r', ''))
+                col = column_index(match.group(1)) if match else position
+                value = cell_value(cell, shared_strings)
+                if value is not None:
+                    values[col] = value
+            yield int(elem.get('r', row_num)), values
+
+
+def read_rows(zf, sheet_path):
+    # 返回 (Excel 行号, 行数据)，表头第1行，数据从第2行开始
+    rows = iter_sheet(zf, sheet_path, read_shared_strings(zf))
+    _, header_values = next(rows, (1, {}))
+    headers = {col: COLUMN_MAP.get(str(h).strip()) for col, h in header_values.items()}
+    for row_num, values in rows:
+        row = {column: '' for column in datastore.DATA_COLUMNS}
+        for col, value in values.items():
+            key = headers.get(col)
+            if key:
+                row[key] = value
+        yield row_num, row
+
+
+def build_image_map(zf, sheet_path):
+    # 映射：行号 -> [(列序号, 图片在 zip 中的路径)]，只解析绘图 XML 的锚点，不读取图片内容
+    image_map = {}
+    for kind, drawing_path in read_rels(zf, sheet_path).values():
+        if kind != 'drawing':
+            continue
+        media = {rel_id: target for rel_id, (_, target) in read_rels(zf, drawing_path).items()}
+        with zf.open(drawing_path) as source:
+            for elem in iter_elements(source, f'{NS_XDR}oneCellAnchor', f'{NS_XDR}twoCellAnchor'):
+                anchor = elem.find(f'{NS_XDR}from')
+                blip = elem.find(f'.//{NS_A}blip')
+                target = media.get(blip.get(f'{NS_REL}embed')) if blip is not None else None
+                if anchor is not None and target:
+                    row = int(anchor.findtext(f'{NS_XDR}row')) + 1  # 行号，从1开始
+                    col = int(anchor.findtext(f'{NS_XDR}col'))
+                    image_map.setdefault(row, []).append((col, target))
+    for images in image_map.values():
+        images.sort(key=lambda image: image[0])
+    return image_map
+
+
+def copy_member(zf, member, path):
+    # 直接把 zip 成员的原始字节写到磁盘，不解码图片；已落盘的图片不再重复写出
+    if os.path.exists(path):
+        return
+    tmp_path = f"{path}.part"
+    with zf.open(member) as src, open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp_path, path)
+
+
+def save_row_images(zf, pool, row, excel_row_num, imgs, output_dir):
+    title = row['title'].strip()
     if not title:
-        title = f"row_{idx+2}"
+        title = f"row_{excel_row_num}"
     # 这里改为“标题_行号”作为文件夹名，避免重复文件夹
     safe_title = title.replace('/', '_').replace('\\', '_').replace(' ', '_')
-    folder_name = f"{safe_title}_{idx+2}"
+    folder_name = f"{safe_title}_{excel_row_num}"
     folder_path = os.path.join(output_dir, folder_name)
     os.makedirs(folder_path, exist_ok=True)
 
-    excel_row_num = idx + 2  # Excel表头第1行，数据从第2行开始
-    imgs = image_map.get(excel_row_num, [])
+    futures = []
+    for i, (_, member) in enumerate(imgs[:datastore.MAX_IMAGES]):
+        # 扩展名沿用 zip 中的原始格式，浏览器按实际内容显示
+        file_name = f'F{i+1}{posixpath.splitext(member)[1] or ".png"}'
+        futures.append(pool.submit(copy_member, zf, member, os.path.join(folder_path, file_name)))
+        row[f'image{i+1}'] = f'/static/images/{folder_name}/{file_name}'
+    return futures
+
+
+def import_excel(excel_file, db_path, output_dir, incremental=False):
+    # zip 只打开一次：ZipFile 支持多线程同时读取不同成员，解压在各线程中并行进行。
+    # 先打开工作簿并解析绘图锚点，文件不存在或已损坏时在碰数据库之前就报错
+    with zipfile.ZipFile(excel_file) as zf:
+        sheet_path = active_sheet_path(zf)
+        image_map = build_image_map(zf, sheet_path)
+        os.makedirs(output_dir, exist_ok=True)
+
+        conn = datastore.connect(db_path)
+        try:
+            datastore.ensure_schema(conn)
+            # 增量模式以帖子链接为键，只导入库里还没有的行
+            seen = {link for (link,) in conn.execute("SELECT post_link FROM data")} if incremental else set()
+            table = 'data' if incremental else datastore.STAGING_TABLE
+
+            conn.execute("BEGIN")
+            try:
+                if not incremental:
+                    # 全量导入写入临时表，旧的 data 表在全部成功前保持不变
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                    datastore.create_table(conn, table)
+                inserted, skipped = load_rows(zf, conn, table, sheet_path, image_map, output_dir, seen, incremental)
+                if incremental:
+                    datastore.bump_generation(conn)
+                else:
+                    datastore.replace_data(conn, table)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            # 替换后的新表重建索引和全文索引
+            datastore.ensure_schema(conn)
+        finally:
+            conn.close()
+    return inserted, skipped
+
+
+def load_rows(zf, conn, table, sheet_path, image_map, output_dir, seen, incremental):
+    sql = datastore.insert_sql(table)
+    inserted = 0
+    skipped = 0
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as pool:
+        batch = []
+        copies = []
+        for excel_row_num, row in read_rows(zf, sheet_path):
+            link = row['post_link']
+            if incremental and link:
+                if link in seen:
+                    skipped += 1
+                    continue
+                seen.add(link)
+
+            copies.extend(save_row_images(zf, pool, row, excel_row_num, image_map.pop(excel_row_num, []), output_dir))
+            # 转换价格列为数字，无法转换设为None
+            row['price'] = datastore.to_price(row['price'])
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH:
+                inserted += flush_batch(conn, sql, batch, copies)
+                batch, copies = [], []
+        inserted += flush_batch(conn, sql, batch, copies)
+    return inserted, skipped
+
+
+def flush_batch(conn, sql, batch, copies):
+    # 先等这一批的图片写完，库里的图片路径总是指向已存在的文件；这里只写入，不提交
+    for future in copies:
+        future.result()
+    if batch:
+        conn.executemany(sql, batch)
+    return len(batch)
+
 
-    # 保存图片
-    for i, (cell, img) in enumerate(imgs[:4]):
-        img_path = os.path.join(folder_path, f'F{i+1}.png')
-        with open(img_path, 'wb') as f:
-            f.write(img._data())
-        df.at[idx, f'image{i+1}'] = f'/static/images/{folder_name}/F{i+1}.png'
+def main():
+    parser = argparse.ArgumentParser(description="把爬虫导出的 Excel（含图片）导入 data.db")
+    parser.add_argument("--excel", default="output.xlsx", help="Excel 文件，默认 output.xlsx")
+    parser.add_argument("--db", default="data.db", help="SQLite 数据库，默认 data.db")
+    parser.add_argument("--images-dir", default="static/images", help="图片输出目录，默认 static/images")
+    parser.add_argument("--incremental", action="store_true", help="增量导入：只插入数据库中不存在的帖子链接，不重建整张表")
+    args = parser.parse_args()
 
-# 转换价格列为数字，无法转换设为None
-df['price'] = pd.to_numeric(df['price'], errors='coerce')
+    inserted, skipped = import_excel(args.excel, args.db, args.images_dir, args.incremental)
+    if args.incremental:
+        print(f"✅ 增量导入完成：新增 {inserted} 条，跳过已存在 {skipped} 条")
+    else:
+        print(f"✅ 数据和图片导入完成！共 {inserted} 条，文件夹名带行号避免重复")
 
-# 写入SQLite数据库
-conn = sqlite3.connect('data.db')
-df.to_sql('data', conn, if_exists='replace', index=False)
-conn.close()
 
-print("✅ 数据和图片导入完成！文件夹名带行号避免重复")
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,34 @@
 import argparse
 import os
-import random
 import re
-import threading
-import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from datetime import datetime
+from itertools import count
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
 
 import requests
 from bs4 import BeautifulSoup
-from openpyxl import Workbook, load_workbook
-from openpyxl.drawing.image import Image as XLImage
-from PIL import Image as PILImage
+
+import parsing
+from archive import RawArchive
+from frontier import PageFrontier
+from http_cache import HttpCache
+from image_store import CHUNK_SIZE, ImageStore, PendingObject
+from metrics import METRICS, MetricsReporter, Profiler, configure_logging, logger, serve_prometheus
+from ratelimit import HostRateLimiter
+from records import ParsedPost, PostRecord
+from sinks import SINK_DEFAULT_PATHS, DataDbSink, TeeSink, export_excel, open_sink
+from state import CrawlState
+from thumbnails import THUMB_FORMATS, ThumbnailGenerator
+from transport import Transport, connection_summary
+
+UNSAFE_FILENAME_CHARS = re.compile(r"[\\/:*?\"<>|]")
+IMAGE_EXT_PATTERN = re.compile(r"\.(jpg|jpeg|png|gif|bmp|webp)$")
+
+DEFAULT_SITE_ROOT = "https://xc8866.com/"
+FETCH_STAGES = {"listing": "page_fetch", "post": "post_fetch"}
 
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
@@ -32,192 +45,146 @@ class CrawlConfig:
     output_xlsx: str = "output.xlsx"
     image_dir: str = "images"
     crawled_file: str = "crawled_posts.txt"
-    min_delay: float = 0.8
-    max_delay: float = 1.5
+    state_db: str = "crawl_state.db"
+    max_attempts: int = 3
+    rate: float = 3.0
+    burst: int = 5
     request_timeout: tuple[int, int] = (3, 6)
+    retries: int = 3
     flush_batch: int = 10
-
-
-@dataclass(slots=True)
-class PostRecord:
-    title: str
-    price: str
-    qq: str
-    wechat: str
-    phone: str
-    post_url: str
-    image_files: list[str]
+    sink: str = "sqlite"
+    store_path: str = "results.db"
+    export_excel: bool = True
+    data_db: str | None = None
+    mode: str = "crawl"
+    engine: str = "thread"
+    page_concurrency: int = 4
+    post_concurrency: int = 16
+    image_concurrency: int = 32
+    parser: str = "html.parser"
+    parse_workers: int = os.cpu_count() or 2
+    queue_size: int = 64
+    thumb_size: int = 100
+    thumb_format: str = "jpeg"
+    incremental: bool = False
+    stop_after: int = 3
+    http_cache: str | None = None
+    cache_ttl_listing: float | None = 0.0
+    cache_ttl_post: float | None = 86400.0
+    cache_ttl_image: float | None = None
+    archive_dir: str | None = None
+    log_level: str = "INFO"
+    log_file: str | None = None
+    metrics_interval: float = 30.0
+    metrics_json: str | None = None
+    metrics_port: int | None = None
+    profile: str | None = None
+    profile_out: str | None = None
 
 
 class XC8866Crawler:
     def __init__(self, config: CrawlConfig) -> None:
         self.config = config
-        self.session = requests.Session()
-        self.session.headers.update(DEFAULT_HEADERS)
+        self.rate_limiter = HostRateLimiter(config.rate, config.burst)
+        # 页面连接池按同时在途的页面/帖子请求数配置，图片连接池按图片并发数配置
+        self.transport = Transport(
+            self.rate_limiter,
+            DEFAULT_HEADERS,
+            config.request_timeout,
+            page_pool_size=max(config.threads, config.page_concurrency + config.post_concurrency),
+            image_pool_size=config.image_concurrency,
+            retries=config.retries,
+        )
+        self.http_cache = None
+        if config.http_cache:
+            self.http_cache = HttpCache(
+                config.http_cache,
+                {"listing": config.cache_ttl_listing, "post": config.cache_ttl_post, "image": config.cache_ttl_image},
+            )
 
+        # 帖子链接相对站点根目录拼接，站点根目录取自起始页（本地测试服务器也能用）
+        self.site_root = self.build_site_root(config.start_url)
         self.output_path = Path(config.output_xlsx)
         self.image_root = Path(config.image_dir)
-        self.crawled_path = Path(config.crawled_file)
+        # 旧的 crawled_posts.txt 只在状态库为空时导入一次
+        self.state = CrawlState(config.state_db, config.crawled_file, config.max_attempts)
 
-        self.image_root.mkdir(parents=True, exist_ok=True)
+        self.archive = RawArchive(config.archive_dir) if config.archive_dir else None
 
-        self.excel_lock = threading.Lock()
-        self.crawled_lock = threading.Lock()
+        self.image_root.mkdir(parents=True, exist_ok=True)
+        self.image_store = ImageStore(self.image_root, config.cache_ttl_image)
+        self.image_pool = ThreadPoolExecutor(max_workers=config.image_concurrency, thread_name_prefix="image")
+        # Excel 嵌入和网页列表都用固定尺寸的缩略图，由进程池并行生成
+        self.thumbnailer = ThumbnailGenerator(
+            self.image_root, config.thumb_size, config.thumb_format, workers=config.parse_workers, log=self.log
+        )
+
+        store_path = config.output_xlsx if config.sink == "excel" else config.store_path
+        self.sink = open_sink(config.sink, store_path, self.log, self.thumbnailer)
+        if config.data_db:
+            self.sink = TeeSink(self.sink, DataDbSink(config.data_db, self.image_root, thumbnailer=self.thumbnailer))
 
     @staticmethod
     def log(msg: str) -> None:
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+        logger.info(msg)
 
     @staticmethod
     def sanitize_filename(name: str) -> str:
-        return re.sub(r"[\\/:*?\"<>|]", "_", name)
+        return UNSAFE_FILENAME_CHARS.sub("_", name)
 
-    def load_crawled(self) -> set[str]:
-        if not self.crawled_path.exists():
-            return set()
+    normalize_url = staticmethod(parsing.normalize_url)
+    extract_contact_by_regex = staticmethod(parsing.extract_contact_by_regex)
+    get_page_threads = staticmethod(parsing.get_page_threads)
+    is_post_link = staticmethod(parsing.is_post_link)
 
-        crawled: set[str] = set()
-        with self.crawled_path.open("r", encoding="utf-8") as file:
-            for line in file:
-                line = line.strip()
-                if not line:
-                    continue
-                crawled.add(line.split("\t")[0])
-        return crawled
-
-    def save_crawled(self, post_id: str, post_url: str) -> None:
-        with self.crawled_lock:
-            with self.crawled_path.open("a", encoding="utf-8") as file:
-                file.write(f"{post_id}\t{post_url}\n")
+    @staticmethod
+    def extract_info_from_table(soup: BeautifulSoup) -> tuple[str, str, str, str]:
+        return parsing.extract_info(parsing.scan_page(soup))
 
     @staticmethod
-    def normalize_url(url: str, base_url: str) -> str:
-        if url.startswith("//"):
-            return "https:" + url
-        if url.startswith("/"):
-            return urljoin(base_url, url)
-        return url
+    def extract_images(soup: BeautifulSoup, page_url: str) -> list[str]:
+        return parsing.extract_images(parsing.scan_page(soup), page_url)
 
     @staticmethod
-    def extract_contact_by_regex(text: str, patterns: list[str]) -> str:
-        for pattern in patterns:
-            match = re.search(pattern, text, flags=re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
-        return ""
-
-    def extract_info_from_table(self, soup: BeautifulSoup) -> tuple[str, str, str, str]:
-        price = qq = wechat = phone = ""
-
-        def set_field(label: str, value: str) -> None:
-            nonlocal price, qq, wechat, phone
-            if not value:
-                return
-            if "价格" in label and not price:
-                price = value
-            elif "QQ" in label.upper() and not qq:
-                qq = value
-            elif "微信" in label and not wechat:
-                wechat = value
-            elif ("电话" in label or "手机" in label) and not phone:
-                phone = value
-
-        for row in soup.select("table tr"):
-            label = ""
-            label_el = row.find(["th", "td"])
-            value_el = label_el.find_next_sibling(["th", "td"]) if label_el else None
-            if label_el and value_el:
-                label = label_el.get_text(" ", strip=True)
-                value = value_el.get_text(" ", strip=True)
-                set_field(label, value)
-
-        for item in soup.select("dl dt, li, div"):
-            line = item.get_text(" ", strip=True)
-            if "：" not in line and ":" not in line:
-                continue
-            parts = re.split(r"[：:]", line, maxsplit=1)
-            if len(parts) != 2:
-                continue
-            set_field(parts[0], parts[1])
-
-        full_text = soup.get_text("\n", strip=True)
-        if not price:
-            price = self.extract_contact_by_regex(full_text, [r"价格\s*[：:]\s*([^\n\r]+)"])
-        if not qq:
-            qq = self.extract_contact_by_regex(full_text, [r"QQ\s*[：:]\s*([0-9A-Za-z_-]{5,20})"])
-        if not wechat:
-            wechat = self.extract_contact_by_regex(full_text, [r"微信\s*[：:]\s*([0-9A-Za-z_-]{5,40})"])
-        if not phone:
-            phone = self.extract_contact_by_regex(full_text, [r"(?:电话|手机)\s*[：:]\s*([0-9+\-\s]{7,20})"])
-
-        return price, qq, wechat, phone
-
-    def extract_images(self, soup: BeautifulSoup, page_url: str) -> list[str]:
-        image_urls: list[str] = []
-        seen: set[str] = set()
-        valid_exts = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
-        src_keys = ("src", "data-src", "data-original", "data-echo", "data-lazy-src")
-
-        for img in soup.find_all("img"):
-            src = ""
-            for key in src_keys:
-                value = img.get(key, "").strip()
-                if value:
-                    src = value
-                    break
-
-            if not src:
-                srcset = img.get("srcset", "").strip()
-                if srcset:
-                    src = srcset.split(",")[0].strip().split(" ")[0]
-
-            if not src:
-                continue
-
-            src_lower = src.lower()
-            if any(x in src_lower for x in ("zwzp.jpg", "default.jpg", "nopic.jpg", "avatar", "logo", "icon")):
-                continue
-
-            img_url = self.normalize_url(src, page_url)
-            ext = os.path.splitext(urlparse(img_url).path)[-1].lower()
-            if ext and ext not in valid_exts:
-                continue
-
-            if img_url not in seen:
-                seen.add(img_url)
-                image_urls.append(img_url)
-
-        return image_urls
+    def extract_title(soup: BeautifulSoup) -> str:
+        return parsing.extract_title(parsing.scan_page(soup))
+
+    def parse_post_html(self, content: bytes, post_url: str) -> ParsedPost:
+        with METRICS.stage("parse"):
+            return parsing.parse_post_html(content, post_url, self.config.parser)
+
+    def fetch(self, url: str, url_class: str, **kwargs) -> requests.Response:
+        # 所有请求都经过按主机共享的令牌桶限速，暂时性错误由传输层退避重试
+        return self.transport.get(url, url_class, **kwargs)
+
+    def fetch_content(self, url: str, url_class: str) -> bytes:
+        with METRICS.stage(FETCH_STAGES[url_class]):
+            content = self._fetch_content(url, url_class)
+        METRICS.counter("crawler_bytes_total", "下载的页面字节数", kind=url_class).inc(len(content))
+        return content
+
+    def _fetch_content(self, url: str, url_class: str) -> bytes:
+        # 列表页、帖子页经过磁盘 HTTP 缓存：TTL 内不发请求，过期后发条件请求
+        if self.http_cache is None:
+            return self.fetch(url, url_class).content
+        entry, headers = self.http_cache.prepare(url, url_class)
+        if entry is not None and entry.fresh:
+            return entry.body
+        response = self.fetch(url, url_class, headers=headers)
+        return self.http_cache.resolve(url, url_class, entry, response.status_code, response.content, response.headers)
+
+    def archive_post(self, post_url: str, content: bytes) -> None:
+        # 开启 --archive 时保存帖子原始 HTML，之后可用 --reparse 离线重新解析
+        if self.archive is not None:
+            self.archive.append(post_url, content)
 
     def parse_post(self, post_url: str) -> PostRecord | None:
         try:
-            response = self.session.get(post_url, timeout=self.config.request_timeout)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, "html.parser")
-
-            meta_title = soup.find("meta", attrs={"property": "og:title"})
-            if meta_title and meta_title.get("content"):
-                title = meta_title["content"].strip()
-            else:
-                meta_desc = soup.find("meta", attrs={"name": "description"})
-                if meta_desc and meta_desc.get("content"):
-                    title = meta_desc["content"].strip()
-                else:
-                    title_tag = soup.select_one("h1, h2, h3, h4.break-all, .thread-title, .topic-title")
-                    title = title_tag.get_text(" ", strip=True) if title_tag else "标题未找到"
-
-            price, qq, wechat, phone = self.extract_info_from_table(soup)
-            image_urls = self.extract_images(soup, post_url)
-
-            return PostRecord(
-                title=title,
-                price=price,
-                qq=qq,
-                wechat=wechat,
-                phone=phone,
-                post_url=post_url,
-                image_files=self.download_images(image_urls, self.build_post_image_dir(post_url)),
-            )
+            content = self.fetch_content(post_url, "post")
+            self.archive_post(post_url, content)
+            parsed = self.parse_post_html(content, post_url)
+            image_files = self.download_images(parsed.image_urls, self.build_post_image_dir(post_url))
+            return parsed.to_record(image_files)
         except Exception as exc:  # noqa: BLE001
             self.log(f"访问帖子失败: {post_url} 错误: {exc}")
             return None
@@ -229,168 +196,144 @@ class XC8866Crawler:
         image_dir.mkdir(parents=True, exist_ok=True)
         return image_dir
 
-    def download_images(self, image_urls: Iterable[str], image_dir: Path) -> list[str]:
-        downloaded_files: list[str] = []
-
-        for index, img_url in enumerate(image_urls, start=1):
-            ext = os.path.splitext(urlparse(img_url).path)[-1].lower()
-            if not re.match(r"\.(jpg|jpeg|png|gif|bmp|webp)$", ext):
-                ext = ".jpg"
-
-            image_name = f"{index}{ext}"
-            image_path = image_dir / image_name
+    @staticmethod
+    def build_image_name(index: int, img_url: str) -> str:
+        ext = os.path.splitext(urlparse(img_url).path)[-1].lower()
+        if not IMAGE_EXT_PATTERN.match(ext):
+            ext = ".jpg"
+        return f"{index}{ext}"
 
-            if image_path.exists():
-                downloaded_files.append(str(image_path))
-                self.log(f"  跳过已存在图片: {image_name}")
-                continue
+    def download_images(self, image_urls: Iterable[str], image_dir: Path) -> list[str]:
+        # 一个帖子的图片并发提交到共享的图片下载池，按原顺序收集结果
+        jobs = [
+            (img_url, self.image_pool.submit(self.download_image, img_url, image_dir / self.build_image_name(index, img_url)))
+            for index, img_url in enumerate(image_urls, start=1)
+        ]
 
+        downloaded_files: list[str] = []
+        for img_url, future in jobs:
             try:
-                response = self.session.get(
-                    img_url,
-                    timeout=self.config.request_timeout,
-                    stream=True,
-                )
-                response.raise_for_status()
-                with image_path.open("wb") as file:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if chunk:
-                            file.write(chunk)
-                downloaded_files.append(str(image_path))
-                self.log(f"  下载图片: {image_name}")
-                time.sleep(random.uniform(0.2, 0.4))
+                downloaded_files.append(future.result())
             except Exception as exc:  # noqa: BLE001
                 self.log(f"图片下载失败: {img_url}, 错误: {exc}")
-
         return downloaded_files
 
-    def append_records_to_excel(self, records: list[PostRecord]) -> None:
-        if not records:
-            return
+    def download_image(self, img_url: str, image_path: Path) -> str:
+        with METRICS.stage("image_download"):
+            return self._download_image(img_url, image_path)
 
-        max_imgs = max(3, max(len(record.image_files) for record in records))
-        headers = ["标题", "价格", "QQ", "微信", "手机"] + [f"图片{i}" for i in range(1, max_imgs + 1)] + ["帖子链接"]
+    def _download_image(self, img_url: str, image_path: Path) -> str:
+        if image_path.exists():
+            logger.debug("  跳过已存在图片: %s", image_path.name)
+            METRICS.counter("crawler_images_total", "处理的图片数", result="existing").inc()
+            return str(image_path)
 
-        if self.output_path.exists():
-            workbook = load_workbook(self.output_path)
-            worksheet = workbook.active
-            existing_headers = [cell.value for cell in worksheet[1]]
-            if len(existing_headers) < len(headers):
-                for col_idx in range(len(existing_headers) + 1, len(headers) + 1):
-                    worksheet.cell(row=1, column=col_idx, value=headers[col_idx - 1])
+        def read(response: requests.Response) -> PendingObject:
+            # 每次尝试都写到新的临时文件，中途断开重试时不会拼接出残缺图片
+            pending = self.image_store.begin()
+            try:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    pending.write(chunk)
+            except BaseException:
+                pending.abort()
+                raise
+            return pending
+
+        object_path = self.image_store.lookup(img_url)
+        if object_path:
+            logger.debug("  复用已下载图片: %s", image_path.name)
+            METRICS.counter("crawler_images_total", "处理的图片数", result="reused").inc()
         else:
-            workbook = Workbook()
-            worksheet = workbook.active
-            worksheet.title = "爬取结果"
-            worksheet.append(headers)
-
-        for record in records:
-            row_values = [record.title, record.price, record.qq, record.wechat, record.phone]
-            worksheet.append(row_values + [""] * max_imgs + [record.post_url])
-            row_idx = worksheet.max_row
-
-            for i, image_path in enumerate(record.image_files[:max_imgs]):
-                try:
-                    PILImage.open(image_path).verify()
-                    excel_image = XLImage(image_path)
-                    excel_image.width = 100
-                    excel_image.height = 100
-                    col_letter = chr(ord("F") + i)
-                    worksheet.add_image(excel_image, f"{col_letter}{row_idx}")
-                except Exception as exc:  # noqa: BLE001
-                    self.log(f"❌ 图片插入失败: {image_path}, 错误: {exc}")
-
-        workbook.save(self.output_path)
-        self.log(f"✅ 写入 Excel：{self.output_path}")
+            object_path = self.image_store.fetch(img_url, lambda: self.transport.request(img_url, "image", read))
+            logger.debug("  下载图片: %s", image_path.name)
+            METRICS.counter("crawler_images_total", "处理的图片数", result="downloaded").inc()
+        self.image_store.link(object_path, image_path)
+        return str(image_path)
+
+    def save_records(self, records: list[PostRecord]) -> None:
+        with METRICS.stage("flush"):
+            self.sink.write(records)
+        METRICS.counter("crawler_posts_total", "写入的帖子数").inc(len(records))
+
+    def save_posts(self, posts: list[tuple[str, PostRecord]]) -> None:
+        # 先写入结果再标记完成：写入失败时异常向上抛出，帖子保持 in_progress，下次启动重新排队
+        self.save_records([record for _, record in posts])
+        for post_id, _ in posts:
+            self.state.mark_done(post_id)
+
+    def export_results(self) -> None:
+        if self.sink.exports_excel:
+            with METRICS.stage("export"):
+                export_excel(self.sink, self.output_path, self.log, self.thumbnailer)
+
+    def extract_post_links(self, content: bytes) -> list[str]:
+        with METRICS.stage("page_parse"):
+            return parsing.extract_post_links(content, self.config.parser)
 
     @staticmethod
-    def get_page_threads(soup: BeautifulSoup) -> list[str]:
-        links: list[str] = []
-        seen: set[str] = set()
-
-        for thread in soup.select("li.media.thread.tap[data-href], li[data-href], [data-href]"):
-            href = thread.get("data-href", "").strip()
-            if href and href not in seen:
-                seen.add(href)
-                links.append(href)
-
-        selectors = [
-            'a[href*="/thread-"]',
-            'a[href*="/topics/"]',
-            'a[href*="/topic/"]',
-            'a[href$=".htm"]',
-        ]
-        for selector in selectors:
-            for anchor in soup.select(selector):
-                href = anchor.get("href", "").strip()
-                if not href:
-                    continue
-                if href.startswith("javascript:") or href.startswith("#"):
-                    continue
-                if href not in seen:
-                    seen.add(href)
-                    links.append(href)
-
-        return links
+    def build_post_id(link: str) -> str:
+        return link.replace(".htm", "").replace("/", "_")
 
     @staticmethod
-    def is_post_link(link: str) -> bool:
-        lower_link = link.lower()
-        return any(token in lower_link for token in ("/thread-", "/topic/", "/topics/")) or lower_link.endswith(".htm")
+    def build_site_root(start_url: str) -> str:
+        parsed = urlparse(start_url)
+        if not parsed.scheme or not parsed.netloc:
+            return DEFAULT_SITE_ROOT
+        return f"{parsed.scheme}://{parsed.netloc}/"
+
+    def build_post_url(self, link: str) -> str:
+        return urljoin(self.site_root, link)
 
-    def crawl_single_page(self, page_url: str, page_num: int, crawled_posts: set[str]) -> None:
+    def crawl_single_page(self, page_url: str, page_num: int) -> int | None:
+        # 返回本页新占位的帖子数，页面抓取失败返回 None
         self.log(f"📄 线程爬取第 {page_num} 页：{page_url}")
-        batch: list[PostRecord] = []
+        batch: list[tuple[str, PostRecord]] = []
+        new_posts = 0
 
         try:
-            response = self.session.get(page_url, timeout=self.config.request_timeout)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, "html.parser")
-
-            links = [link for link in self.get_page_threads(soup) if self.is_post_link(link)]
+            links = self.extract_post_links(self.fetch_content(page_url, "listing"))
             if not links:
                 self.log(f"⚠️ 第 {page_num} 页没有获取到帖子链接，跳过")
-                return
+                return 0
 
             self.log(f"🔍 本页共发现 {len(links)} 条帖子链接")
             for idx, link in enumerate(links, start=1):
-                post_id = link.replace(".htm", "").replace("/", "_")
-                if post_id in crawled_posts:
-                    self.log(f"跳过已爬取帖子 {post_id} ({link})")
+                post_id = self.build_post_id(link)
+                post_url = self.build_post_url(link)
+                if not self.state.claim(post_id, post_url):
+                    logger.debug("跳过已爬取帖子 %s (%s)", post_id, link)
                     continue
+                new_posts += 1
 
-                post_url = urljoin("https://xc8866.com/", link)
                 self.log(f"➡️ 正在爬取帖子 {idx}/{len(links)}: {post_url}")
                 record = self.parse_post(post_url)
                 if not record:
                     self.log(f"⚠️ 帖子解析失败，跳过: {post_url}")
+                    self.state.mark_failed(post_id, "访问或解析失败")
                     continue
 
                 self.log(f"  标题: {record.title}")
                 self.log(f"  下载图片 {len(record.image_files)} 张")
 
-                batch.append(record)
-                self.save_crawled(post_id, post_url)
-                crawled_posts.add(post_id)
+                batch.append((post_id, record))
 
                 if len(batch) >= self.config.flush_batch:
-                    with self.excel_lock:
-                        self.append_records_to_excel(batch)
+                    self.save_posts(batch)
                     self.log(f"✅ 已保存 {len(batch)} 条帖子数据")
                     batch.clear()
 
-                time.sleep(random.uniform(self.config.min_delay, self.config.max_delay))
-
             if batch:
-                with self.excel_lock:
-                    self.append_records_to_excel(batch)
+                self.save_posts(batch)
                 self.log(f"✅ 本页剩余 {len(batch)} 条帖子数据已保存")
 
         except Exception as exc:  # noqa: BLE001
             self.log(f"爬取页面失败: {page_url} 错误: {exc}")
+            return None
+        return new_posts
 
     @staticmethod
-    def build_page_urls(start_url: str, total_pages: int) -> list[tuple[int, str]]:
+    def iter_page_urls(start_url: str, total_pages: int | None) -> Iterator[tuple[int, str]]:
+        # 起始链接立即校验，页码按需生成；total_pages 为 None 时不设上限（仅增量模式使用）
         parsed = urlparse(start_url)
         query_pairs = parse_qsl(parsed.query, keep_blank_values=True)
         query_map = dict(query_pairs)
@@ -401,74 +344,254 @@ class XC8866Crawler:
             except ValueError as exc:
                 raise ValueError("起始链接中的 page 参数必须是数字") from exc
 
-            urls: list[tuple[int, str]] = []
-            for page_num in range(start_page, start_page + total_pages):
+            def build_url(page_num: int) -> str:
                 current_pairs = [
                     (key, str(page_num) if key == "page" else value)
                     for key, value in query_pairs
                 ]
-                rebuilt = parsed._replace(query=urlencode(current_pairs))
-                urls.append((page_num, urlunparse(rebuilt)))
-            return urls
-
-        match = re.search(r"forum-23-(\d+)\.htm", start_url)
-        if match:
+                return urlunparse(parsed._replace(query=urlencode(current_pairs)))
+        else:
+            match = re.search(r"forum-23-(\d+)\.htm", start_url)
+            if not match:
+                raise ValueError("起始链接格式不正确，应包含 page 参数（如 ?page=1）")
             start_page = int(match.group(1))
-            urls = []
-            for page_num in range(start_page, start_page + total_pages):
-                url = re.sub(r"forum-23-\d+\.htm", f"forum-23-{page_num}.htm", start_url)
-                urls.append((page_num, url))
-            return urls
 
-        raise ValueError("起始链接格式不正确，应包含 page 参数（如 ?page=1）")
+            def build_url(page_num: int) -> str:
+                return re.sub(r"forum-23-\d+\.htm", f"forum-23-{page_num}.htm", start_url)
+
+        page_nums = count(start_page) if total_pages is None else range(start_page, start_page + total_pages)
+        return ((page_num, build_url(page_num)) for page_num in page_nums)
+
+    @classmethod
+    def build_page_urls(cls, start_url: str, total_pages: int) -> list[tuple[int, str]]:
+        return list(cls.iter_page_urls(start_url, total_pages))
+
+    def page_frontier(self, workers: int) -> PageFrontier:
+        # 增量模式下 --total-pages 只是上限，未提供时一直翻页直到连续若干页没有新帖子
+        total_pages = (self.config.total_pages or None) if self.config.incremental else self.config.total_pages
+        stop_after = self.config.stop_after if self.config.incremental else None
+        return PageFrontier(self.iter_page_urls(self.config.start_url, total_pages), stop_after, self.log, workers)
 
     def crawl(self) -> None:
-        crawled_posts = self.load_crawled()
-        page_urls = self.build_page_urls(self.config.start_url, self.config.total_pages)
+        try:
+            if self.config.engine == "async":
+                from async_engine import AsyncCrawlEngine
+
+                AsyncCrawlEngine(self).run()
+            elif self.config.engine == "pipeline":
+                from pipeline import PipelineEngine
+
+                PipelineEngine(self).run()
+            else:
+                self.crawl_threaded()
 
+            if self.config.export_excel:
+                self.export_results()
+        finally:
+            self.close()
+
+    def reparse(self) -> None:
+        try:
+            from reparse import ReparseEngine
+
+            ReparseEngine(self).run()
+            if self.config.export_excel:
+                self.export_results()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.image_pool.shutdown(wait=True)
+        self.image_store.close()
+        self.sink.close()
+        self.thumbnailer.close()
+        self.state.close()
+        self.transport.close()
+        self.log(connection_summary())
+        if self.http_cache is not None:
+            self.log(self.http_cache.summary())
+            self.http_cache.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def crawl_threaded(self) -> None:
+        frontier = self.page_frontier(self.config.threads)
+        # 每个线程循环从边界领取下一页，而不是预先提交全部页面
         with ThreadPoolExecutor(max_workers=self.config.threads) as executor:
-            future_map = {
-                executor.submit(self.crawl_single_page, url, page_num, crawled_posts): page_num
-                for page_num, url in page_urls
-            }
-            for future in as_completed(future_map):
-                page_num = future_map[future]
+            workers = [executor.submit(self.page_worker, frontier) for _ in range(self.config.threads)]
+            for future in as_completed(workers):
                 try:
                     future.result()
-                    self.log(f"✅ 第 {page_num} 页爬取完成")
                 except Exception as exc:  # noqa: BLE001
-                    self.log(f"❌ 第 {page_num} 页爬取异常: {exc}")
+                    self.log(f"❌ 列表页线程异常: {exc}")
 
         self.log("✅ 所有任务完成，程序退出")
 
+    def page_worker(self, frontier: PageFrontier) -> None:
+        for page_num, page_url in frontier:
+            new_posts = None
+            try:
+                new_posts = self.crawl_single_page(page_url, page_num)
+            finally:
+                # 出错也要结算这一页，否则等待窗口的其他线程会一直卡住
+                frontier.report(page_num, new_posts)
+            if new_posts is not None:
+                self.log(f"✅ 第 {page_num} 页爬取完成")
+
+
+def ttl_arg(value: float) -> float | None:
+    # 命令行用负数表示永不过期
+    return None if value < 0 else value
+
 
 def parse_args() -> CrawlConfig:
     parser = argparse.ArgumentParser(description="xc8866 爬虫：抓取帖子、图片并写入 Excel")
-    parser.add_argument("--start-url", type=str, required=True, help="起始页链接")
-    parser.add_argument("--total-pages", type=int, required=True, help="总共需要爬取多少页")
+    parser.add_argument("--start-url", type=str, help="起始页链接")
+    parser.add_argument("--total-pages", type=int, help="总共需要爬取多少页（增量模式下为上限，可省略）")
     parser.add_argument("--threads", type=int, default=6, help="最大线程数，默认 6")
     parser.add_argument("--output", type=str, default="output.xlsx", help="Excel 输出文件，默认 output.xlsx")
     parser.add_argument("--images-dir", type=str, default="images", help="图片输出目录，默认 images")
-    parser.add_argument("--state-file", type=str, default="crawled_posts.txt", help="断点状态文件，默认 crawled_posts.txt")
-    parser.add_argument("--flush-batch", type=int, default=10, help="累计多少条写入一次 Excel，默认 10")
+    parser.add_argument("--state-db", type=str, default="crawl_state.db", help="断点续传状态库（SQLite），默认 crawl_state.db")
+    parser.add_argument("--state-file", type=str, default="crawled_posts.txt", help="旧版断点文件，状态库为空时自动导入，默认 crawled_posts.txt")
+    parser.add_argument("--incremental", action="store_true", help="增量模式：按页顺序翻页，连续若干页没有新帖子就停止")
+    parser.add_argument("--stop-after", type=int, default=3, help="增量模式：连续多少个列表页没有新帖子（或抓取失败）后停止，默认 3")
+    parser.add_argument("--http-cache", type=str, default=None, help="启用磁盘 HTTP 缓存（如 http_cache.db），保存响应和 ETag/Last-Modified，过期后发条件请求")
+    parser.add_argument("--cache-ttl-listing", type=float, default=0, help="列表页缓存有效秒数，默认 0（每次都条件请求），负数表示永不过期")
+    parser.add_argument("--cache-ttl-post", type=float, default=86400, help="帖子页缓存有效秒数，默认 86400，负数表示永不过期")
+    parser.add_argument("--cache-ttl-image", type=float, default=-1, help="图片 URL 索引有效秒数，过期后重新下载，默认 -1（永不过期）")
+    parser.add_argument("--archive", type=str, default=None, help="把帖子原始 HTML 压缩追加到该目录（如 raw_archive），供 --reparse 使用")
+    parser.add_argument("--reparse", action="store_true", help="不访问网络，从 --archive 归档重新解析全部帖子并写入新的主存储")
+    parser.add_argument("--retries", type=int, default=3, help="单个请求遇到超时、断连或 429/5xx 时的最多重试次数（指数退避加随机抖动，遵守 Retry-After），默认 3")
+    parser.add_argument("--max-attempts", type=int, default=3, help="单个帖子最多尝试次数，失败的帖子在之后的运行中重试，默认 3")
+    parser.add_argument("--flush-batch", type=int, default=None, help="累计多少条写入一次输出，excel 输出默认 10，其余默认 1（逐条写入）")
+    parser.add_argument("--sink", choices=tuple(SINK_DEFAULT_PATHS), default="sqlite", help="结果主存储：sqlite（默认，WAL 追加写）、jsonl，或旧的 excel（每次 flush 重写整个工作簿）")
+    parser.add_argument("--store", type=str, default=None, help="结果主存储文件，默认 results.db / results.jsonl")
+    parser.add_argument("--data-db", type=str, default=None, help="同时把帖子直接写入查询网页使用的 SQLite（如 data.db），无需再运行 import_excel.py")
+    parser.add_argument("--no-export", action="store_true", help="爬取结束后不生成 Excel（之后可用 --export-only 按需导出）")
+    parser.add_argument("--export-only", action="store_true", help="不爬取，只把主存储中的结果导出为 Excel")
+    parser.add_argument("--rate", type=float, default=3.0, help="每个主机每秒最多请求数（令牌桶速率），默认 3")
+    parser.add_argument("--burst", type=int, default=5, help="每个主机允许的突发请求数（令牌桶容量），默认 5")
+    parser.add_argument("--parser", choices=parsing.PARSERS, default="html.parser", help="HTML 解析后端：html.parser（默认）或更快的 lxml（需安装 lxml）")
+    parser.add_argument("--engine", choices=("thread", "async", "pipeline"), default="thread", help="抓取引擎：thread（每页一个线程）、async（单事件循环）或 pipeline（抓取/多进程解析/写入分阶段），默认 thread")
+    parser.add_argument("--page-concurrency", type=int, default=4, help="async/pipeline 引擎：列表页最大并发请求数，默认 4")
+    parser.add_argument("--post-concurrency", type=int, default=16, help="async/pipeline 引擎：帖子页最大并发请求数，默认 16")
+    parser.add_argument("--image-concurrency", type=int, default=32, help="图片最大并发下载数（所有引擎共享的图片下载阶段），默认 32")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 2, help="pipeline 引擎的解析进程数，同时也是缩略图生成进程数，默认 CPU 核数")
+    parser.add_argument("--queue-size", type=int, default=64, help="pipeline 引擎：阶段间队列容量，默认 64")
+    parser.add_argument("--thumb-size", type=int, default=100, help="缩略图最长边像素数（Excel 嵌入和网页列表使用），默认 100")
+    parser.add_argument("--thumb-format", choices=tuple(THUMB_FORMATS), default="jpeg", help="缩略图格式：jpeg（默认）或 webp")
+    parser.add_argument("--log-level", choices=("DEBUG", "INFO", "WARNING"), default="INFO", help="日志级别，DEBUG 会输出逐张图片和跳过的帖子，默认 INFO")
+    parser.add_argument("--log-file", type=str, default=None, help="同时把日志写入该文件")
+    parser.add_argument("--metrics-interval", type=float, default=30, help="每隔多少秒输出一行吞吐/延迟汇总，0 表示关闭，默认 30")
+    parser.add_argument("--metrics-json", type=str, default=None, help="定期把完整指标写入该 JSON 文件")
+    parser.add_argument("--metrics-port", type=int, default=None, help="在本地该端口提供 Prometheus 格式的 /metrics")
+    parser.add_argument("--profile", choices=("cprofile", "sample"), default=None, help="性能分析：cprofile（主线程，.prof）或 sample（所有线程的折叠栈，可生成火焰图）")
+    parser.add_argument("--profile-out", type=str, default=None, help="性能分析输出文件，默认 crawl.prof / crawl.folded")
 
     args = parser.parse_args()
+    if args.export_only and args.reparse:
+        parser.error("--export-only 和 --reparse 不能同时使用")
+    if args.reparse and not args.archive:
+        parser.error("--reparse 需要用 --archive 指定归档目录")
+    crawling = not (args.export_only or args.reparse)
+    if crawling and not args.start_url:
+        parser.error("爬取时必须提供 --start-url")
+    if crawling and not args.incremental and args.total_pages is None:
+        parser.error("非增量模式必须提供 --total-pages")
+
+    flush_batch = args.flush_batch
+    if flush_batch is None:
+        flush_batch = 10 if args.sink == "excel" else 1
 
     return CrawlConfig(
-        start_url=args.start_url,
-        total_pages=args.total_pages,
+        start_url=args.start_url or "",
+        total_pages=args.total_pages or 0,
         threads=max(1, args.threads),
         output_xlsx=args.output,
         image_dir=args.images_dir,
         crawled_file=args.state_file,
-        flush_batch=max(1, args.flush_batch),
+        state_db=args.state_db,
+        max_attempts=max(1, args.max_attempts),
+        retries=max(0, args.retries),
+        flush_batch=max(1, flush_batch),
+        sink=args.sink,
+        store_path=args.store or SINK_DEFAULT_PATHS[args.sink],
+        export_excel=not args.no_export,
+        data_db=args.data_db,
+        rate=max(0.1, args.rate),
+        burst=max(1, args.burst),
+        engine=args.engine,
+        page_concurrency=max(1, args.page_concurrency),
+        post_concurrency=max(1, args.post_concurrency),
+        image_concurrency=max(1, args.image_concurrency),
+        parser=args.parser,
+        parse_workers=max(1, args.parse_workers),
+        queue_size=max(1, args.queue_size),
+        thumb_size=max(16, args.thumb_size),
+        thumb_format=args.thumb_format,
+        incremental=args.incremental,
+        stop_after=max(1, args.stop_after),
+        http_cache=args.http_cache,
+        cache_ttl_listing=ttl_arg(args.cache_ttl_listing),
+        cache_ttl_post=ttl_arg(args.cache_ttl_post),
+        cache_ttl_image=ttl_arg(args.cache_ttl_image),
+        archive_dir=args.archive,
+        mode="export" if args.export_only else "reparse" if args.reparse else "crawl",
+        log_level=args.log_level,
+        log_file=args.log_file,
+        metrics_interval=max(0.0, args.metrics_interval),
+        metrics_json=args.metrics_json,
+        metrics_port=args.metrics_port,
+        profile=args.profile,
+        profile_out=args.profile_out or ("crawl.prof" if args.profile == "cprofile" else "crawl.folded"),
     )
 
 
 def main() -> None:
     config = parse_args()
+    if config.mode == "export" and not Path(config.store_path).exists():
+        raise SystemExit(f"主存储不存在: {config.store_path}")
+    if config.mode == "reparse":
+        if not (Path(config.archive_dir) / "index.db").exists():
+            raise SystemExit(f"归档不存在: {config.archive_dir}")
+        # 主存储是追加写入的，写进已有文件会和旧结果重复
+        store_path = config.output_xlsx if config.sink == "excel" else config.store_path
+        if Path(store_path).exists():
+            raise SystemExit(f"重新解析需要写入新的主存储，请用 --store 指定一个不存在的文件: {store_path}")
+
+    configure_logging(config.log_level, config.log_file)
     crawler = XC8866Crawler(config)
-    crawler.crawl()
+    if config.mode == "export":
+        try:
+            crawler.export_results()
+        finally:
+            crawler.close()
+        return
+
+    reporter = None
+    if config.metrics_interval or config.metrics_json:
+        # 关闭汇总行但指定了 JSON 文件时，仍按 30 秒间隔只刷新文件
+        log = logger.info if config.metrics_interval else (lambda msg: None)
+        reporter = MetricsReporter(METRICS, config.metrics_interval or 30.0, config.metrics_json, log).start()
+    if config.metrics_port:
+        serve_prometheus(METRICS, config.metrics_port)
+        logger.info(f"📈 指标端点: http://127.0.0.1:{config.metrics_port}/metrics")
+    try:
+        if config.profile:
+            with Profiler(config.profile, config.profile_out):
+                run_mode(crawler)
+        else:
+            run_mode(crawler)
+    finally:
+        if reporter:
+            reporter.stop()
+
+
+def run_mode(crawler: XC8866Crawler) -> None:
+    if crawler.config.mode == "reparse":
+        crawler.reparse()
+    else:
+        crawler.crawl()
 
 
 if __name__ == "__main__":
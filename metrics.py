@@ -0,0 +1,355 @@
+import atexit
+import bisect
+import cProfile
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterator
+
+# 延迟直方图的桶上界（秒），覆盖几毫秒的解析到十几秒的慢请求
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOG_FORMAT = "[%(asctime)s] %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+logger = logging.getLogger("xc8866")
+# 未调用 configure_logging（例如作为库使用）时直接输出 INFO 及以上日志，格式与命令行一致
+_default_handler = logging.StreamHandler(sys.stdout)
+_default_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+logger.addHandler(_default_handler)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+def label_text(labels: tuple[tuple[str, str], ...]) -> str:
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" if labels else ""
+
+
+class CounterMetric:
+    kind = "counter"
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class GaugeMetric(CounterMetric):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self.lock:
+            self.value = value
+
+
+class HistogramMetric:
+    kind = "histogram"
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        # 按桶估算分位数（取所在桶的上界），足够用于汇总行
+        with self.lock:
+            target = q * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if bucket_count and seen >= target:
+                    return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return 0.0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"count": self.count, "sum": self.sum, "buckets": dict(zip(map(str, self.buckets), self.counts))}
+
+
+class Metrics:
+    # 进程内指标注册表：计数器、仪表（在途数）和延迟直方图，按 (名称, 标签) 区分
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics: dict[tuple[str, tuple[tuple[str, str], ...]], object] = {}
+        self.help: dict[str, str] = {}
+        self.started = time.monotonic()
+
+    def get(self, factory, name: str, help_text: str, labels: dict[str, str]):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, factory())
+                self.help.setdefault(name, help_text)
+        return metric
+
+    def counter(self, name: str, help_text: str = "", **labels: str) -> CounterMetric:
+        return self.get(CounterMetric, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels: str) -> GaugeMetric:
+        return self.get(GaugeMetric, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", **labels: str) -> HistogramMetric:
+        return self.get(HistogramMetric, name, help_text, labels)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        # 一个阶段的一次执行：记录耗时、次数、失败次数和在途数
+        inflight = self.gauge("crawler_inflight", "正在执行的阶段任务数", stage=stage)
+        inflight.inc()
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.counter("crawler_stage_errors_total", "阶段失败次数", stage=stage).inc()
+            raise
+        finally:
+            self.histogram("crawler_stage_seconds", "阶段耗时（秒）", stage=stage).observe(time.perf_counter() - start)
+            inflight.dec()
+
+    def items(self):
+        with self.lock:
+            return sorted(self.metrics.items(), key=lambda item: item[0])
+
+    def snapshot(self) -> dict:
+        result: dict[str, dict] = {}
+        for (name, labels), metric in self.items():
+            result.setdefault(name, {})[label_text(labels) or "{}"] = metric.snapshot()
+        return {"uptime_seconds": time.monotonic() - self.started, "metrics": result}
+
+    def to_prometheus(self) -> str:
+        lines: list[str] = []
+        declared: set[str] = set()
+        for (name, labels), metric in self.items():
+            if name not in declared:
+                declared.add(name)
+                if self.help.get(name):
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, HistogramMetric):
+                snapshot = metric.snapshot()
+                cumulative = 0
+                for bucket, bucket_count in snapshot["buckets"].items():
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{label_text(labels + (('le', bucket),))} {cumulative}")
+                lines.append(f"{name}_bucket{label_text(labels + (('le', '+Inf'),))} {snapshot['count']}")
+                lines.append(f"{name}_sum{label_text(labels)} {snapshot['sum']}")
+                lines.append(f"{name}_count{label_text(labels)} {snapshot['count']}")
+            else:
+                lines.append(f"{name}{label_text(labels)} {metric.snapshot()}")
+        return "\n".join(lines) + "\n"
+
+    def summary_line(self) -> str:
+        # 周期性汇总：每个阶段的次数和 p50/p95，外加在途数和锁等待
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        parts = [f"📊 运行 {elapsed:.0f}s"]
+        posts = self.counter("crawler_posts_total", "写入的帖子数").snapshot()
+        parts.append(f"帖子 {posts:.0f}（{posts / elapsed:.1f}/s）")
+        for (name, labels), metric in self.items():
+            label = dict(labels)
+            if name == "crawler_stage_seconds" and metric.count:
+                parts.append(
+                    f"{label['stage']} {metric.count}次 p50={metric.quantile(0.5) * 1000:.0f}ms p95={metric.quantile(0.95) * 1000:.0f}ms"
+                )
+            elif name == "crawler_inflight" and metric.snapshot():
+                parts.append(f"{label['stage']}在途 {metric.snapshot():.0f}")
+            elif name == "crawler_lock_wait_seconds" and metric.count:
+                parts.append(f"锁 {label['lock']} 等待 {metric.sum * 1000:.0f}ms")
+        return " | ".join(parts)
+
+
+METRICS = Metrics()
+
+
+class TimedLock:
+    # 带等待时间统计的互斥锁：先无阻塞尝试，拿不到时才计时，未竞争时几乎没有额外开销
+    def __init__(self, name: str, metrics: Metrics = METRICS) -> None:
+        self.lock = threading.Lock()
+        self.wait = metrics.histogram("crawler_lock_wait_seconds", "等待锁的时间（秒）", lock=name)
+        self.contended = metrics.counter("crawler_lock_contended_total", "锁竞争次数", lock=name)
+
+    def acquire(self) -> bool:
+        if self.lock.acquire(blocking=False):
+            return True
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.wait.observe(time.perf_counter() - start)
+        self.contended.inc()
+        return True
+
+    def release(self) -> None:
+        self.lock.release()
+
+    def __enter__(self) -> "TimedLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class MetricsReporter:
+    # 后台线程：每隔 interval 秒输出一行汇总，并按需把完整指标写入 JSON 文件
+    def __init__(
+        self,
+        metrics: Metrics,
+        interval: float,
+        json_path: str | None = None,
+        log: Callable[[str], None] = logger.info,
+    ) -> None:
+        self.metrics = metrics
+        self.interval = interval
+        self.json_path = Path(json_path) if json_path else None
+        self.log = log
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="metrics", daemon=True)
+
+    def start(self) -> "MetricsReporter":
+        self.thread.start()
+        return self
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def report(self) -> None:
+        self.log(self.metrics.summary_line())
+        if self.json_path:
+            tmp_path = self.json_path.with_name(self.json_path.name + ".tmp")
+            tmp_path.write_text(json.dumps(self.metrics.snapshot(), ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.json_path)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.report()
+
+
+def serve_prometheus(metrics: Metrics, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    # 本地 Prometheus 文本格式端点：http://127.0.0.1:<port>/metrics
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args) -> None:  # noqa: A002
+            pass
+
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class SamplingProfiler:
+    # 采样分析器：定时抓取所有线程的调用栈，输出 flamegraph.pl / speedscope 可读的折叠栈格式
+    def __init__(self, path: str, interval: float = 0.005) -> None:
+        self.path = Path(path)
+        self.interval = interval
+        self.stacks: StackCounter[str] = StackCounter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="sampler", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                    frame = frame.f_back
+                thread_name = names.get(thread_id, str(thread_id)).split("-")[0]
+                self.stacks[";".join([thread_name, *reversed(stack)])] += 1
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        with self.path.open("w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    # --profile 钩子：cprofile 只分析主线程（async 引擎的事件循环在主线程），sample 覆盖所有线程
+    def __init__(self, kind: str, path: str) -> None:
+        self.kind = kind
+        self.path = path
+        self.profile = cProfile.Profile() if kind == "cprofile" else None
+        self.sampler = SamplingProfiler(path) if kind == "sample" else None
+
+    def __enter__(self) -> "Profiler":
+        if self.profile:
+            self.profile.enable()
+        if self.sampler:
+            self.sampler.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(self.path)
+        if self.sampler:
+            self.sampler.stop()
+        logger.info(f"🔬 性能分析结果已写入 {self.path}")
+
+
+def configure_logging(level: str = "INFO", log_file: str | None = None) -> None:
+    # 日志经队列交给后台线程写出，工作线程只做一次入队；DEBUG 级别的逐图片日志默认直接丢弃
+    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    formatter = logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(level.upper())
+    logger.propagate = False
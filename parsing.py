@@ -0,0 +1,293 @@
+import os
+import re
+from dataclasses import dataclass, field
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+
+from records import ParsedPost
+
+PARSERS = ("html.parser", "lxml")
+TEXT_TYPES = (NavigableString, CData)
+TITLE_TAGS = {"h1", "h2", "h3"}
+TITLE_CLASSES = {"thread-title", "topic-title"}
+VALID_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+IMAGE_SRC_KEYS = ("src", "data-src", "data-original", "data-echo", "data-lazy-src")
+IMAGE_SKIP_TOKENS = ("zwzp.jpg", "default.jpg", "nopic.jpg", "avatar", "logo", "icon")
+
+COLONS = ("：", ":")
+PRICE_PATTERNS = [re.compile(r"价格\s*[：:]\s*([^\n\r]+)", re.IGNORECASE)]
+QQ_PATTERNS = [re.compile(r"QQ\s*[：:]\s*([0-9A-Za-z_-]{5,20})", re.IGNORECASE)]
+WECHAT_PATTERNS = [re.compile(r"微信\s*[：:]\s*([0-9A-Za-z_-]{5,40})", re.IGNORECASE)]
+PHONE_PATTERNS = [re.compile(r"(?:电话|手机)\s*[：:]\s*([0-9+\-\s]{7,20})", re.IGNORECASE)]
+
+
+@dataclass(slots=True)
+class PageScan:
+    # 一次遍历帖子页 DOM 收集到的所有候选：标题来源、表格行、标签/值候选、图片、正文文本
+    meta_title: Tag | None = None
+    meta_description: Tag | None = None
+    title_tag: Tag | None = None
+    table_rows: list[Tag] = field(default_factory=list)
+    # "dl dt, li, div" 候选元素在 strings 中覆盖的区间 [start, end)
+    item_ranges: list[tuple[int, int]] = field(default_factory=list)
+    images: list[Tag] = field(default_factory=list)
+    strings: list[str] = field(default_factory=list)
+
+
+def make_soup(content: bytes | str, parser: str = "html.parser") -> BeautifulSoup:
+    return BeautifulSoup(content, parser)
+
+
+def is_title_tag(tag: Tag) -> bool:
+    # 等价于 select_one("h1, h2, h3, h4.break-all, .thread-title, .topic-title")
+    if tag.name in TITLE_TAGS:
+        return True
+    classes = tag.get("class") or ()
+    if tag.name == "h4" and "break-all" in classes:
+        return True
+    return any(name in TITLE_CLASSES for name in classes)
+
+
+def scan_page(soup: BeautifulSoup) -> PageScan:
+    scan = PageScan()
+    # 显式栈做先序遍历，保持文档顺序，同时记录是否位于 table / dl 内
+    stack: list[tuple[object, bool, bool]] = [(child, False, False) for child in reversed(soup.contents)]
+    while stack:
+        node, in_table, in_dl = stack.pop()
+        if type(node) is int:
+            # 候选元素的子孙都已访问完，补上区间终点
+            start, _ = scan.item_ranges[node]
+            scan.item_ranges[node] = (start, len(scan.strings))
+            continue
+        if not isinstance(node, Tag):
+            if type(node) in TEXT_TYPES:
+                text = node.strip()
+                if text:
+                    scan.strings.append(text)
+            continue
+
+        name = node.name
+        if name == "meta":
+            if scan.meta_title is None and node.get("property") == "og:title":
+                scan.meta_title = node
+            if scan.meta_description is None and node.get("name") == "description":
+                scan.meta_description = node
+        elif name == "img":
+            scan.images.append(node)
+        elif name == "tr" and in_table:
+            scan.table_rows.append(node)
+
+        if scan.title_tag is None and is_title_tag(node):
+            scan.title_tag = node
+        if name in ("li", "div") or (name == "dt" and in_dl):
+            scan.item_ranges.append((len(scan.strings), len(scan.strings)))
+            stack.append((len(scan.item_ranges) - 1, in_table, in_dl))
+
+        child_in_table = in_table or name == "table"
+        child_in_dl = in_dl or name == "dl"
+        for child in reversed(node.contents):
+            stack.append((child, child_in_table, child_in_dl))
+    return scan
+
+
+def normalize_url(url: str, base_url: str) -> str:
+    if url.startswith("//"):
+        return "https:" + url
+    if url.startswith("/"):
+        return urljoin(base_url, url)
+    return url
+
+
+def extract_contact_by_regex(text: str, patterns: list[re.Pattern[str]]) -> str:
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).strip()
+    return ""
+
+
+def extract_title(scan: PageScan) -> str:
+    meta_title = scan.meta_title
+    if meta_title and meta_title.get("content"):
+        return meta_title["content"].strip()
+
+    meta_desc = scan.meta_description
+    if meta_desc and meta_desc.get("content"):
+        return meta_desc["content"].strip()
+
+    title_tag = scan.title_tag
+    return title_tag.get_text(" ", strip=True) if title_tag else "标题未找到"
+
+
+def label_fields(label: str) -> tuple[bool, bool, bool, bool]:
+    return (
+        "价格" in label,
+        "QQ" in label.upper(),
+        "微信" in label,
+        "电话" in label or "手机" in label,
+    )
+
+
+def pick_field(flags: tuple[bool, bool, bool, bool], values: list[str]) -> int | None:
+    # 与原先 if/elif 链一致：按 价格、QQ、微信、电话 的顺序取第一个匹配且尚未填写的字段
+    for index, matched in enumerate(flags):
+        if matched and not values[index]:
+            return index
+    return None
+
+
+def find_colon(text: str) -> int:
+    positions = [pos for pos in (text.find(colon) for colon in COLONS) if pos >= 0]
+    return min(positions) if positions else -1
+
+
+def extract_info(scan: PageScan) -> tuple[str, str, str, str]:
+    values = ["", "", "", ""]
+
+    for row in scan.table_rows:
+        label_el = row.find(["th", "td"])
+        value_el = label_el.find_next_sibling(["th", "td"]) if label_el else None
+        if label_el and value_el:
+            value = value_el.get_text(" ", strip=True)
+            if not value:
+                continue
+            index = pick_field(label_fields(label_el.get_text(" ", strip=True)), values)
+            if index is not None:
+                values[index] = value
+
+    # 候选元素的文本 = strings[start:end] 用空格拼接，嵌套元素共享同一段叶子文本。
+    # 预先算好“下一个含冒号的文本节点”和各关键字的前缀计数，每个元素 O(1) 判断，
+    # 只有真正要填写字段时才拼接 value，避免按祖先层数重复构造整段文本。
+    strings = scan.strings
+    count = len(strings)
+    next_colon = [count] * (count + 1)
+    for i in range(count - 1, -1, -1):
+        next_colon[i] = i if find_colon(strings[i]) >= 0 else next_colon[i + 1]
+
+    prefix = [[0] * (count + 1) for _ in range(4)]
+    for i, text in enumerate(strings):
+        for index, matched in enumerate(label_fields(text)):
+            prefix[index][i + 1] = prefix[index][i] + matched
+
+    for start, end in scan.item_ranges:
+        if all(values):
+            break
+        k = next_colon[start]
+        if k >= end:
+            continue
+        pos = find_colon(strings[k])
+        head, tail = strings[k][:pos], strings[k][pos + 1:]
+        if not tail and k + 1 == end:
+            continue
+        head_flags = label_fields(head)
+        flags = tuple(
+            prefix[index][k] - prefix[index][start] > 0 or head_flags[index] for index in range(4)
+        )
+        index = pick_field(flags, values)
+        if index is not None:
+            values[index] = " ".join([tail, *strings[k + 1:end]]) if k + 1 < end else tail
+
+    price, qq, wechat, phone = values
+    if not (price and qq and wechat and phone):
+        full_text = "\n".join(strings)
+        if not price:
+            price = extract_contact_by_regex(full_text, PRICE_PATTERNS)
+        if not qq:
+            qq = extract_contact_by_regex(full_text, QQ_PATTERNS)
+        if not wechat:
+            wechat = extract_contact_by_regex(full_text, WECHAT_PATTERNS)
+        if not phone:
+            phone = extract_contact_by_regex(full_text, PHONE_PATTERNS)
+
+    return price, qq, wechat, phone
+
+
+def extract_images(scan: PageScan, page_url: str) -> list[str]:
+    image_urls: list[str] = []
+    seen: set[str] = set()
+
+    for img in scan.images:
+        src = ""
+        for key in IMAGE_SRC_KEYS:
+            value = img.get(key, "").strip()
+            if value:
+                src = value
+                break
+
+        if not src:
+            srcset = img.get("srcset", "").strip()
+            if srcset:
+                src = srcset.split(",")[0].strip().split(" ")[0]
+
+        if not src:
+            continue
+
+        src_lower = src.lower()
+        if any(x in src_lower for x in IMAGE_SKIP_TOKENS):
+            continue
+
+        img_url = normalize_url(src, page_url)
+        ext = os.path.splitext(urlparse(img_url).path)[-1].lower()
+        if ext and ext not in VALID_IMAGE_EXTS:
+            continue
+
+        if img_url not in seen:
+            seen.add(img_url)
+            image_urls.append(img_url)
+
+    return image_urls
+
+
+def parse_post_html(content: bytes, post_url: str, parser: str = "html.parser") -> ParsedPost:
+    scan = scan_page(make_soup(content, parser))
+    price, qq, wechat, phone = extract_info(scan)
+    return ParsedPost(
+        title=extract_title(scan),
+        price=price,
+        qq=qq,
+        wechat=wechat,
+        phone=phone,
+        post_url=post_url,
+        image_urls=extract_images(scan, post_url),
+    )
+
+
+def get_page_threads(soup: BeautifulSoup) -> list[str]:
+    links: list[str] = []
+    seen: set[str] = set()
+
+    for thread in soup.select("li.media.thread.tap[data-href], li[data-href], [data-href]"):
+        href = thread.get("data-href", "").strip()
+        if href and href not in seen:
+            seen.add(href)
+            links.append(href)
+
+    selectors = [
+        'a[href*="/thread-"]',
+        'a[href*="/topics/"]',
+        'a[href*="/topic/"]',
+        'a[href$=".htm"]',
+    ]
+    for selector in selectors:
+        for anchor in soup.select(selector):
+            href = anchor.get("href", "").strip()
+            if not href:
+                continue
+            if href.startswith("javascript:") or href.startswith("#"):
+                continue
+            if href not in seen:
+                seen.add(href)
+                links.append(href)
+
+    return links
+
+
+def is_post_link(link: str) -> bool:
+    lower_link = link.lower()
+    return any(token in lower_link for token in ("/thread-", "/topic/", "/topics/")) or lower_link.endswith(".htm")
+
+
+def extract_post_links(content: bytes, parser: str = "html.parser") -> list[str]:
+    soup = make_soup(content, parser)
+    return [link for link in get_page_threads(soup) if is_post_link(link)]
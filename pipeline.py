@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import parsing
+from frontier import PageFrontier
+from metrics import METRICS, logger
+from main import XC8866Crawler
+from records import ParsedPost, PostRecord
+
+STOP = None
+
+
+def parse_timed(content: bytes, post_url: str, parser: str) -> tuple[ParsedPost, float]:
+    # 在解析进程里计时，主进程据此记录解析耗时（不含排队时间）
+    start = time.perf_counter()
+    parsed = parsing.parse_post_html(content, post_url, parser)
+    return parsed, time.perf_counter() - start
+
+
+# 分阶段流水线：抓取线程只做网络 I/O，原始字节交给进程池解析，结果由单一写入线程落盘。
+# 各阶段之间是有界队列，下游处理不过来时上游自动阻塞（背压）。
+class PipelineEngine:
+    def __init__(self, crawler: XC8866Crawler) -> None:
+        self.crawler = crawler
+        self.config = crawler.config
+        self.log = crawler.log
+
+        size = self.config.queue_size
+        self.post_queue: queue.Queue[tuple[str, str] | None] = queue.Queue(maxsize=size)
+        self.raw_queue: queue.Queue[tuple[str, str, bytes] | None] = queue.Queue(maxsize=size)
+        self.parsed_queue: queue.Queue[tuple[str, ParsedPost] | None] = queue.Queue(maxsize=size)
+        self.record_queue: queue.Queue[tuple[str, PostRecord] | None] = queue.Queue(maxsize=size)
+        # 进程池中在途的解析任务（按提交顺序），队列容量即在途上限，避免原始页面无限堆积在内存里
+        self.pending_queue: queue.Queue[tuple[str, str, Future] | None] = queue.Queue(maxsize=self.config.parse_workers * 2)
+
+    def run(self) -> None:
+        frontier = self.crawler.page_frontier(self.config.page_concurrency)
+
+        with ProcessPoolExecutor(max_workers=self.config.parse_workers) as parse_pool:
+            self.parse_pool = parse_pool
+
+            fetchers = self.start_threads(self.fetch_worker, self.config.post_concurrency, "fetch")
+            dispatcher = self.start_threads(self.parse_dispatcher, 1, "parse")
+            collector = self.start_threads(self.parse_collector, 1, "collect")
+            # 图片本身由爬虫共享的图片下载池并发下载，这里的线程只负责按帖子收集结果
+            downloaders = self.start_threads(self.image_worker, self.config.post_concurrency, "image")
+            writer = self.start_threads(self.writer, 1, "writer")
+
+            page_threads = self.start_threads(lambda: self.page_worker(frontier), self.config.page_concurrency, "page")
+            for thread in page_threads:
+                thread.join()
+
+            # 逐级关闭：上一阶段全部退出后，再通知下一阶段
+            self.stop_stage(self.post_queue, fetchers)
+            self.stop_stage(self.raw_queue, dispatcher)
+            for thread in collector:
+                thread.join()
+            self.stop_stage(self.parsed_queue, downloaders)
+            self.stop_stage(self.record_queue, writer)
+
+        self.log("✅ 所有任务完成，程序退出")
+
+    @staticmethod
+    def start_threads(target, count: int, name: str) -> list[threading.Thread]:
+        threads = [threading.Thread(target=target, name=f"{name}-{i}", daemon=True) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    @staticmethod
+    def stop_stage(stage_queue: queue.Queue, threads: list[threading.Thread]) -> None:
+        for _ in threads:
+            stage_queue.put(STOP)
+        for thread in threads:
+            thread.join()
+
+    def page_worker(self, frontier: PageFrontier) -> None:
+        for page_num, page_url in frontier:
+            new_posts = None
+            try:
+                new_posts = self.crawl_page(page_url, page_num)
+            finally:
+                frontier.report(page_num, new_posts)
+
+    def crawl_page(self, page_url: str, page_num: int) -> int | None:
+        # 返回本页新入队的帖子数，页面抓取失败返回 None
+        self.log(f"📄 流水线爬取第 {page_num} 页：{page_url}")
+        try:
+            content = self.crawler.fetch_content(page_url, "listing")
+            links = self.parse_pool.submit(parsing.extract_post_links, content, self.config.parser).result()
+        except Exception as exc:  # noqa: BLE001
+            self.log(f"爬取页面失败: {page_url} 错误: {exc}")
+            return None
+
+        if not links:
+            self.log(f"⚠️ 第 {page_num} 页没有获取到帖子链接，跳过")
+            return 0
+
+        self.log(f"🔍 本页共发现 {len(links)} 条帖子链接")
+        new_posts = 0
+        for link in links:
+            post_id = self.crawler.build_post_id(link)
+            post_url = self.crawler.build_post_url(link)
+            if not self.crawler.state.claim(post_id, post_url):
+                logger.debug("跳过已爬取帖子 %s (%s)", post_id, link)
+                continue
+            self.post_queue.put((post_id, post_url))
+            new_posts += 1
+        self.log(f"✅ 第 {page_num} 页链接已全部入队")
+        return new_posts
+
+    def fetch_worker(self) -> None:
+        while (item := self.post_queue.get()) is not STOP:
+            post_id, post_url = item
+            self.log(f"➡️ 正在抓取帖子: {post_url}")
+            try:
+                content = self.crawler.fetch_content(post_url, "post")
+                self.crawler.archive_post(post_url, content)
+            except Exception as exc:  # noqa: BLE001
+                self.log(f"访问帖子失败: {post_url} 错误: {exc}")
+                self.crawler.state.mark_failed(post_id, str(exc))
+                continue
+            self.raw_queue.put((post_id, post_url, content))
+
+    def parse_dispatcher(self) -> None:
+        while (item := self.raw_queue.get()) is not STOP:
+            post_id, post_url, content = item
+            future = self.parse_pool.submit(parse_timed, content, post_url, self.config.parser)
+            self.pending_queue.put((post_id, post_url, future))
+        self.pending_queue.put(STOP)
+
+    def parse_collector(self) -> None:
+        while (item := self.pending_queue.get()) is not STOP:
+            post_id, post_url, future = item
+            try:
+                parsed, seconds = future.result()
+            except Exception as exc:  # noqa: BLE001
+                METRICS.counter("crawler_stage_errors_total", "阶段失败次数", stage="parse").inc()
+                self.log(f"⚠️ 帖子解析失败，跳过: {post_url} 错误: {exc}")
+                self.crawler.state.mark_failed(post_id, str(exc))
+                continue
+            METRICS.histogram("crawler_stage_seconds", "阶段耗时（秒）", stage="parse").observe(seconds)
+            self.parsed_queue.put((post_id, parsed))
+
+    def image_worker(self) -> None:
+        while (item := self.parsed_queue.get()) is not STOP:
+            post_id, parsed = item
+            try:
+                image_dir = self.crawler.build_post_image_dir(parsed.post_url)
+                record = parsed.to_record(self.crawler.download_images(parsed.image_urls, image_dir))
+            except Exception as exc:  # noqa: BLE001
+                self.log(f"图片下载失败: {parsed.post_url} 错误: {exc}")
+                self.crawler.state.mark_failed(post_id, str(exc))
+                continue
+            self.record_queue.put((post_id, record))
+
+    def writer(self) -> None:
+        batch: list[tuple[str, PostRecord]] = []
+        while (item := self.record_queue.get()) is not STOP:
+            post_id, record = item
+            self.log(f"  标题: {record.title}")
+            self.log(f"  下载图片 {len(record.image_files)} 张")
+            batch.append((post_id, record))
+
+            if len(batch) >= self.config.flush_batch:
+                self.flush(batch)
+                batch = []
+
+        if batch:
+            self.flush(batch)
+
+    def flush(self, batch: list[tuple[str, PostRecord]]) -> None:
+        # 写入线程不能退出，否则上游队列会被塞满；写入失败的帖子不标记完成，保持 in_progress，下次启动重新抓取
+        try:
+            self.crawler.save_posts(batch)
+            self.log(f"✅ 已保存 {len(batch)} 条帖子数据")
+        except Exception as exc:  # noqa: BLE001
+            self.log(f"❌ 写入结果失败 {len(batch)} 条，下次运行时重新抓取，错误: {exc}")
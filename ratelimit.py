@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+BACKOFF_STATUSES = {429, 503}
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, min_rate: float, max_backoff: float) -> None:
+        self.target_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = max(1, burst)
+        self.max_backoff = max_backoff
+
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.backoff = 1.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # 预定一个令牌并返回需要等待的秒数；令牌允许透支，后来者按顺序排队
+        with self.lock:
+            # 暂停期间 updated 在未来：令牌从暂停结束时才开始补充，排队的请求依次排在暂停之后
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            self.tokens -= 1
+            wait = self.updated - now + (-self.tokens / self.rate if self.tokens < 0 else 0.0)
+            return max(wait, self.paused_until - now)
+
+    def penalize(self, retry_after: float | None) -> float:
+        with self.lock:
+            now = time.monotonic()
+            delay = retry_after if retry_after is not None else self.backoff
+            delay = min(delay, self.max_backoff)
+            self.paused_until = max(self.paused_until, now + delay)
+            # 乘性降速，并清空积攒的令牌，从暂停结束时才重新补充，避免暂停结束后突发
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            return delay
+
+    def reward(self) -> None:
+        with self.lock:
+            if self.rate < self.target_rate:
+                self.rate = min(self.target_rate, self.rate + self.target_rate * 0.05)
+            self.backoff = 1.0
+
+
+class HostRateLimiter:
+    def __init__(self, rate: float, burst: int, min_rate: float = 0.2, max_backoff: float = 60.0) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_backoff = max_backoff
+        self.buckets: dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst, self.min_rate, self.max_backoff)
+                self.buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url: str) -> None:
+        wait = self.bucket(url).reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url: str) -> None:
+        wait = self.bucket(url).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def observe(self, url: str, status: int, retry_after: str | None = None) -> float | None:
+        # 429/503 时退避并降速，返回退避秒数；其余响应逐步恢复速率
+        bucket = self.bucket(url)
+        if status in BACKOFF_STATUSES:
+            return bucket.penalize(parse_retry_after(retry_after))
+        bucket.reward()
+        return None
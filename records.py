@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class PostRecord:
+    title: str
+    price: str
+    qq: str
+    wechat: str
+    phone: str
+    post_url: str
+    image_files: list[str]
+
+
+@dataclass(slots=True)
+class ParsedPost:
+    title: str
+    price: str
+    qq: str
+    wechat: str
+    phone: str
+    post_url: str
+    image_urls: list[str]
+
+    def to_record(self, image_files: list[str]) -> PostRecord:
+        return PostRecord(
+            title=self.title,
+            price=self.price,
+            qq=self.qq,
+            wechat=self.wechat,
+            phone=self.phone,
+            post_url=self.post_url,
+            image_files=image_files,
+        )
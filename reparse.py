@@ -0,0 +1,80 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+import parsing
+from archive import read_frame
+from main import XC8866Crawler
+from records import ParsedPost, PostRecord
+
+# 重新解析时每批写入主存储的帖子数
+REPARSE_BATCH = 200
+
+
+def parse_archived(segment_path: str, offset: int, size: int, post_url: str, parser: str) -> ParsedPost:
+    # 在解析进程里读取、解压并解析，主进程只传递偏移量
+    return parsing.parse_post_html(read_frame(segment_path, offset, size), post_url, parser)
+
+
+# 离线重新解析：从原始 HTML 归档读取帖子，用进程池并行解析，图片只从图片库索引映射，不访问网络
+class ReparseEngine:
+    def __init__(self, crawler: XC8866Crawler) -> None:
+        self.crawler = crawler
+        self.config = crawler.config
+        self.log = crawler.log
+        self.archive = crawler.archive
+
+    def run(self) -> None:
+        total = self.archive.count()
+        self.log(f"🔁 开始重新解析归档中的 {total} 个帖子（{self.config.parse_workers} 个进程）")
+
+        done = 0
+        batch: list[PostRecord] = []
+        # 在途任务有上限，原始页面不会全部堆在内存里
+        pending: deque[tuple[str, Future]] = deque()
+        max_pending = self.config.parse_workers * 4
+
+        with ProcessPoolExecutor(max_workers=self.config.parse_workers) as pool:
+            for page in self.archive.iter_pages():
+                pending.append(
+                    (page.url, pool.submit(parse_archived, page.segment_path, page.offset, page.size, page.url, self.config.parser))
+                )
+                if len(pending) >= max_pending:
+                    done += self.collect(pending.popleft(), batch)
+                    batch = self.flush(batch)
+            while pending:
+                done += self.collect(pending.popleft(), batch)
+                batch = self.flush(batch)
+        self.flush(batch, force=True)
+        self.log(f"✅ 重新解析完成：成功 {done} / {total} 个帖子")
+
+    def collect(self, item: tuple[str, Future], batch: list[PostRecord]) -> int:
+        post_url, future = item
+        try:
+            parsed = future.result()
+        except Exception as exc:  # noqa: BLE001
+            self.log(f"⚠️ 帖子解析失败，跳过: {post_url} 错误: {exc}")
+            return 0
+        batch.append(parsed.to_record(self.map_images(parsed)))
+        return 1
+
+    def map_images(self, parsed: ParsedPost) -> list[str]:
+        # 只使用图片库里已有的对象，缺失的图片直接跳过
+        image_dir = self.crawler.build_post_image_dir(parsed.post_url)
+        image_files: list[str] = []
+        for index, img_url in enumerate(parsed.image_urls, start=1):
+            image_path: Path = image_dir / self.crawler.build_image_name(index, img_url)
+            if not image_path.exists():
+                object_path = self.crawler.image_store.lookup(img_url)
+                if object_path is None:
+                    continue
+                self.crawler.image_store.link(object_path, image_path)
+            image_files.append(str(image_path))
+        return image_files
+
+    def flush(self, batch: list[PostRecord], force: bool = False) -> list[PostRecord]:
+        if batch and (force or len(batch) >= REPARSE_BATCH):
+            self.crawler.save_records(batch)
+            self.log(f"✅ 已保存 {len(batch)} 条帖子数据")
+            return []
+        return batch
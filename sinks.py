@@ -0,0 +1,395 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.drawing.image import Image as XLImage
+from PIL import Image as PILImage
+
+import datastore
+from metrics import TimedLock
+from records import PostRecord
+from thumbnails import EXCEL_THUMB_FORMAT, ThumbnailGenerator
+
+Logger = Callable[[str], None]
+# 导出时每批生成缩略图的帖子数，批内的图片由进程池并行处理
+EXPORT_THUMB_BATCH = 200
+
+
+def build_headers(max_imgs: int) -> list[str]:
+    return ["标题", "价格", "QQ", "微信", "手机"] + [f"图片{i}" for i in range(1, max_imgs + 1)] + ["帖子链接"]
+
+
+def record_thumbnails(
+    records: list[PostRecord],
+    thumbnailer: ThumbnailGenerator | None,
+    max_imgs: int,
+    fmt: str | None = None,
+) -> dict[str, str]:
+    if thumbnailer is None:
+        return {}
+    return thumbnailer.generate((path for record in records for path in record.image_files[:max_imgs]), fmt)
+
+
+def add_record_images(
+    worksheet,
+    record: PostRecord,
+    row_idx: int,
+    max_imgs: int,
+    log: Logger,
+    thumbs: dict[str, str] | None = None,
+) -> None:
+    # 有缩略图时嵌入缩略图，工作簿体积和打开速度不再受原图大小影响
+    thumbs = thumbs or {}
+    for i, original_path in enumerate(record.image_files[:max_imgs]):
+        image_path = thumbs.get(original_path, original_path)
+        try:
+            PILImage.open(image_path).verify()
+            excel_image = XLImage(image_path)
+            excel_image.width = 100
+            excel_image.height = 100
+            col_letter = chr(ord("F") + i)
+            worksheet.add_image(excel_image, f"{col_letter}{row_idx}")
+        except Exception as exc:  # noqa: BLE001
+            log(f"❌ 图片插入失败: {image_path}, 错误: {exc}")
+
+
+class ResultSink:
+    # 结果输出层：爬虫每完成一批帖子就调用 write，结束时调用 close
+    exports_excel = True
+
+    def write(self, records: list[PostRecord]) -> None:
+        raise NotImplementedError
+
+    def iter_records(self) -> Iterator[PostRecord]:
+        raise NotImplementedError
+
+    def max_image_count(self) -> int:
+        return max((len(record.image_files) for record in self.iter_records()), default=0)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteSink(ResultSink):
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.lock = TimedLock("sqlite_sink")
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY,
+                title TEXT,
+                price TEXT,
+                qq TEXT,
+                wechat TEXT,
+                phone TEXT,
+                post_url TEXT,
+                image_files TEXT,
+                image_count INTEGER,
+                created_at TEXT
+            )
+            """
+        )
+        # 每个帖子只保留一行：写入后、状态库提交前崩溃时，续跑会重新写入同一帖子。
+        # 旧库可能已有重复行，建唯一索引前只保留每个帖子最新的一行
+        if not self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_results_post_url'"
+        ).fetchone():
+            self.conn.execute("DELETE FROM results WHERE id NOT IN (SELECT MAX(id) FROM results GROUP BY post_url)")
+            self.conn.execute("CREATE UNIQUE INDEX idx_results_post_url ON results(post_url)")
+        self.conn.commit()
+
+    def write(self, records: list[PostRecord]) -> None:
+        if not records:
+            return
+        now = datetime.now().isoformat(timespec="seconds")
+        rows = [
+            (
+                record.title,
+                record.price,
+                record.qq,
+                record.wechat,
+                record.phone,
+                record.post_url,
+                json.dumps(record.image_files, ensure_ascii=False),
+                len(record.image_files),
+                now,
+            )
+            for record in records
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO results (title, price, qq, wechat, phone, post_url, image_files, image_count, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(post_url) DO UPDATE SET title = excluded.title, price = excluded.price, qq = excluded.qq, "
+                "wechat = excluded.wechat, phone = excluded.phone, image_files = excluded.image_files, "
+                "image_count = excluded.image_count, created_at = excluded.created_at",
+                rows,
+            )
+            self.conn.commit()
+
+    def iter_records(self) -> Iterator[PostRecord]:
+        # 独立连接读取，导出时不阻塞写入
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(
+                "SELECT title, price, qq, wechat, phone, post_url, image_files FROM results ORDER BY id"
+            )
+            for title, price, qq, wechat, phone, post_url, image_files in cursor:
+                yield PostRecord(title, price, qq, wechat, phone, post_url, json.loads(image_files or "[]"))
+        finally:
+            conn.close()
+
+    def max_image_count(self) -> int:
+        with self.lock:
+            value = self.conn.execute("SELECT MAX(image_count) FROM results").fetchone()[0]
+        return value or 0
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class JsonlSink(ResultSink):
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.lock = TimedLock("jsonl_sink")
+        self.file = self.path.open("a", encoding="utf-8")
+
+    def write(self, records: list[PostRecord]) -> None:
+        if not records:
+            return
+        lines = "".join(
+            json.dumps(
+                {
+                    "title": record.title,
+                    "price": record.price,
+                    "qq": record.qq,
+                    "wechat": record.wechat,
+                    "phone": record.phone,
+                    "post_url": record.post_url,
+                    "image_files": record.image_files,
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+            for record in records
+        )
+        with self.lock:
+            self.file.write(lines)
+            self.file.flush()
+
+    def iter_records(self) -> Iterator[PostRecord]:
+        # 状态库分批提交，写入后、提交前崩溃时续跑会再追加同一帖子；每个 post_url 只取最后一行。
+        # 第一遍只记下每个帖子最后出现的行号，第二遍再解析输出，不把全部结果留在内存里
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as file:
+            last_line = {json.loads(line)["post_url"]: number for number, line in enumerate(file) if line.strip()}
+            file.seek(0)
+            for number, line in enumerate(file):
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                if last_line[item["post_url"]] != number:
+                    continue
+                yield PostRecord(
+                    title=item["title"],
+                    price=item["price"],
+                    qq=item["qq"],
+                    wechat=item["wechat"],
+                    phone=item["phone"],
+                    post_url=item["post_url"],
+                    image_files=item["image_files"],
+                )
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+
+class ExcelSink(ResultSink):
+    # 旧的输出方式：每次 flush 都重新加载并保存整个工作簿，数据量大时很慢
+    exports_excel = False
+
+    def __init__(self, path: str | Path, log: Logger, thumbnailer: ThumbnailGenerator | None = None) -> None:
+        self.output_path = Path(path)
+        self.log = log
+        self.thumbnailer = thumbnailer
+        self.lock = TimedLock("excel_sink")
+
+    def write(self, records: list[PostRecord]) -> None:
+        if not records:
+            return
+        with self.lock:
+            self.append_records_to_excel(records)
+
+    def append_records_to_excel(self, records: list[PostRecord]) -> None:
+        max_imgs = max(3, max(len(record.image_files) for record in records))
+        headers = build_headers(max_imgs)
+
+        if self.output_path.exists():
+            workbook = load_workbook(self.output_path)
+            worksheet = workbook.active
+            existing_headers = [cell.value for cell in worksheet[1]]
+            if len(existing_headers) < len(headers):
+                for col_idx in range(len(existing_headers) + 1, len(headers) + 1):
+                    worksheet.cell(row=1, column=col_idx, value=headers[col_idx - 1])
+        else:
+            workbook = Workbook()
+            worksheet = workbook.active
+            worksheet.title = "爬取结果"
+            worksheet.append(headers)
+
+        thumbs = record_thumbnails(records, self.thumbnailer, max_imgs, EXCEL_THUMB_FORMAT)
+        for record in records:
+            row_values = [record.title, record.price, record.qq, record.wechat, record.phone]
+            worksheet.append(row_values + [""] * max_imgs + [record.post_url])
+            add_record_images(worksheet, record, worksheet.max_row, max_imgs, self.log, thumbs)
+
+        workbook.save(self.output_path)
+        self.log(f"✅ 写入 Excel：{self.output_path}")
+
+
+class DataDbSink(ResultSink):
+    # 直接把帖子写入 app.py 读取的 data.db，无需再走 Excel 导入。
+    # image1..4 指向缩略图供列表显示，original1..4 指向原图，只在网页放大查看时加载
+    exports_excel = False
+
+    def __init__(
+        self,
+        path: str | Path,
+        image_root: str | Path,
+        image_url_prefix: str = "/images",
+        thumbnailer: ThumbnailGenerator | None = None,
+    ) -> None:
+        self.image_root = Path(image_root).resolve()
+        self.image_url_prefix = image_url_prefix.rstrip("/")
+        self.thumbnailer = thumbnailer
+        self.lock = TimedLock("data_db")
+        self.conn = datastore.connect(path)
+        datastore.ensure_schema(self.conn)
+
+    def image_url(self, image_file: str) -> str:
+        relative = Path(image_file).resolve().relative_to(self.image_root)
+        return f"{self.image_url_prefix}/{relative.as_posix()}"
+
+    def to_row(self, record: PostRecord, thumbs: dict[str, str]) -> dict:
+        row = {
+            "title": record.title,
+            "price": datastore.to_price(record.price),
+            "qq": record.qq,
+            "wechat": record.wechat,
+            "phone": record.phone,
+            "post_link": record.post_url,
+        }
+        image_files = record.image_files[: datastore.MAX_IMAGES]
+        for i in range(datastore.MAX_IMAGES):
+            if i < len(image_files):
+                original = self.image_url(image_files[i])
+                row[f"image{i + 1}"] = self.image_url(thumbs[image_files[i]]) if image_files[i] in thumbs else original
+                row[f"original{i + 1}"] = original
+            else:
+                row[f"image{i + 1}"] = ""
+                row[f"original{i + 1}"] = ""
+        return row
+
+    def write(self, records: list[PostRecord]) -> None:
+        if not records:
+            return
+        thumbs = record_thumbnails(records, self.thumbnailer, datastore.MAX_IMAGES)
+        rows = [self.to_row(record, thumbs) for record in records]
+        with self.lock:
+            datastore.upsert_rows(self.conn, rows)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class TeeSink(ResultSink):
+    # 主存储之外再同步写入其他输出；读取和导出只看主存储
+    def __init__(self, primary: ResultSink, *others: ResultSink) -> None:
+        self.primary = primary
+        self.others = others
+        self.exports_excel = primary.exports_excel
+
+    def write(self, records: list[PostRecord]) -> None:
+        self.primary.write(records)
+        for sink in self.others:
+            sink.write(records)
+
+    def iter_records(self) -> Iterator[PostRecord]:
+        return self.primary.iter_records()
+
+    def max_image_count(self) -> int:
+        return self.primary.max_image_count()
+
+    def close(self) -> None:
+        for sink in (self.primary, *self.others):
+            sink.close()
+
+
+def export_excel(
+    sink: ResultSink,
+    output_path: str | Path,
+    log: Logger,
+    thumbnailer: ThumbnailGenerator | None = None,
+) -> int:
+    # 只写模式一次性生成工作簿，内存和耗时只与本次导出的数据量线性相关
+    output_path = Path(output_path)
+    max_imgs = max(3, sink.max_image_count())
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("爬取结果")
+    worksheet.append(build_headers(max_imgs))
+
+    row_idx = 1
+    batch: list[PostRecord] = []
+
+    def write_batch() -> None:
+        nonlocal row_idx
+        thumbs = record_thumbnails(batch, thumbnailer, max_imgs, EXCEL_THUMB_FORMAT)
+        for record in batch:
+            row_idx += 1
+            row_values = [record.title, record.price, record.qq, record.wechat, record.phone]
+            worksheet.append(row_values + [""] * max_imgs + [record.post_url])
+            add_record_images(worksheet, record, row_idx, max_imgs, log, thumbs)
+        batch.clear()
+
+    for record in sink.iter_records():
+        batch.append(record)
+        if len(batch) >= EXPORT_THUMB_BATCH:
+            write_batch()
+    write_batch()
+
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    workbook.save(tmp_path)
+    os.replace(tmp_path, output_path)
+    log(f"✅ 导出 Excel：{output_path}（{row_idx - 1} 条）")
+    return row_idx - 1
+
+
+SINK_DEFAULT_PATHS = {
+    "sqlite": "results.db",
+    "jsonl": "results.jsonl",
+    "excel": "output.xlsx",
+}
+
+
+def open_sink(kind: str, path: str | Path, log: Logger, thumbnailer: ThumbnailGenerator | None = None) -> ResultSink:
+    if kind == "sqlite":
+        return SqliteSink(path)
+    if kind == "jsonl":
+        return JsonlSink(path)
+    if kind == "excel":
+        return ExcelSink(path, log, thumbnailer)
+    raise ValueError(f"未知的输出类型: {kind}")
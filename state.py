@@ -0,0 +1,139 @@
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+from metrics import TimedLock
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+# 攒够这么多次状态变更或超过这么多秒才提交一次事务，避免每个帖子都 fsync
+COMMIT_EVERY = 50
+COMMIT_INTERVAL = 2.0
+
+
+class CrawlState:
+    # 断点续传状态库（SQLite WAL）：每个帖子一行，记录状态、尝试次数和时间戳。
+    # 查询都走主键，启动时不把历史读进内存，历史再多启动开销也不变
+    def __init__(self, path: str | Path, legacy_file: str | Path | None = None, max_attempts: int = 3) -> None:
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.lock = TimedLock("crawl_state")
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id TEXT PRIMARY KEY,
+                post_url TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            ) WITHOUT ROWID
+            """
+        )
+        # 启动时按状态查找中断的帖子，不扫描整张表
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_status ON posts(status)")
+        # 上次运行中断时还在处理的帖子重新排队
+        self.conn.execute("UPDATE posts SET status = ? WHERE status = ?", (PENDING, IN_PROGRESS))
+        self.conn.commit()
+
+        self.dirty = 0
+        self.last_commit = time.monotonic()
+        if legacy_file:
+            self.import_legacy(Path(legacy_file))
+
+    @staticmethod
+    def now() -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def import_legacy(self, legacy_path: Path) -> int:
+        # 只在状态库为空时导入旧的 crawled_posts.txt（每行 “帖子ID\t链接”）
+        if not legacy_path.exists():
+            return 0
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM posts LIMIT 1").fetchone():
+                return 0
+            now = self.now()
+
+            def rows():
+                with legacy_path.open("r", encoding="utf-8") as file:
+                    for line in file:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        post_id, _, post_url = line.partition("\t")
+                        yield post_id, post_url, DONE, 1, now, now
+
+            with self.conn:
+                cursor = self.conn.executemany(
+                    "INSERT OR IGNORE INTO posts (post_id, post_url, status, attempts, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows(),
+                )
+            return cursor.rowcount
+
+    def claim(self, post_id: str, post_url: str) -> bool:
+        # 原子占位：新帖子、待处理或失败次数未用完的帖子置为 in_progress 并返回 True；
+        # 已完成、正被其他线程处理或重试次数用完的返回 False
+        now = self.now()
+        with self.lock:
+            cursor = self.conn.execute(
+                """
+                INSERT INTO posts (post_id, post_url, status, attempts, created_at, updated_at)
+                VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT(post_id) DO UPDATE SET
+                    status = excluded.status,
+                    post_url = excluded.post_url,
+                    attempts = attempts + 1,
+                    updated_at = excluded.updated_at
+                WHERE status = ? OR (status = ? AND attempts < ?)
+                """,
+                (post_id, post_url, IN_PROGRESS, now, now, PENDING, FAILED, self.max_attempts),
+            )
+            self._changed()
+            return cursor.rowcount == 1
+
+    def mark_done(self, post_id: str) -> None:
+        self._set_status(post_id, DONE, None)
+
+    def mark_failed(self, post_id: str, error: str = "") -> None:
+        self._set_status(post_id, FAILED, error)
+
+    def _set_status(self, post_id: str, status: str, error: str | None) -> None:
+        with self.lock:
+            self.conn.execute(
+                "UPDATE posts SET status = ?, error = ?, updated_at = ? WHERE post_id = ?",
+                (status, error, self.now(), post_id),
+            )
+            self._changed()
+
+    def _changed(self) -> None:
+        # 调用方已持有 self.lock；同一连接内未提交的变更对其他线程的 claim 立即可见
+        self.dirty += 1
+        if self.dirty >= COMMIT_EVERY or time.monotonic() - self.last_commit >= COMMIT_INTERVAL:
+            self._commit()
+
+    def _commit(self) -> None:
+        self.conn.commit()
+        self.dirty = 0
+        self.last_commit = time.monotonic()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._commit()
+
+    def counts(self) -> dict[str, int]:
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM posts GROUP BY status").fetchall())
+
+    def close(self) -> None:
+        with self.lock:
+            self._commit()
+            self.conn.close()
@@ -0,0 +1,132 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable
+
+from PIL import Image as PILImage
+
+THUMB_FORMATS = {"jpeg": ".jpg", "webp": ".webp"}
+# 网页按需提供的 WebP 版本放在 <图片根目录>/_webp 下，文件名为原文件名加 .webp
+WEBP_DIR = "_webp"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".bmp"}
+# openpyxl 只能嵌入 PNG/JPEG/GIF 等格式，Excel 用的缩略图固定为 JPEG
+EXCEL_THUMB_FORMAT = "jpeg"
+
+
+def thumbnail_path(image_root: Path, image_path: str | Path, fmt: str) -> Path:
+    # 缩略图放在 <图片根目录>/_thumbs 下，保持与原图相同的相对路径，只换扩展名
+    image_path = Path(image_path)
+    try:
+        relative = image_path.resolve().relative_to(image_root.resolve())
+        target = image_root / "_thumbs" / relative
+    except ValueError:
+        target = image_path.parent / "_thumbs" / image_path.name
+    return target.with_suffix(THUMB_FORMATS[fmt])
+
+
+def webp_variant_path(image_root: Path, relative: str | Path) -> Path:
+    return image_root / WEBP_DIR / f"{relative}.webp"
+
+
+def make_thumbnail(src: str, dst: str, size: int, fmt: str, quality: int) -> str:
+    # 进程池中执行：已有且不旧于原图的缩略图直接复用；size 为 0 时只转换格式，不缩放
+    if os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+        return dst
+
+    with PILImage.open(src) as image:
+        if size:
+            image.thumbnail((size, size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.part"
+        image.save(tmp, format=fmt.upper(), quality=quality)
+    os.replace(tmp, dst)
+    return dst
+
+
+class ThumbnailGenerator:
+    def __init__(
+        self,
+        image_root: str | Path,
+        size: int = 100,
+        fmt: str = "jpeg",
+        quality: int = 80,
+        workers: int | None = None,
+        log: Callable[[str], None] = print,
+    ) -> None:
+        self.image_root = Path(image_root)
+        self.size = size
+        self.fmt = fmt
+        self.quality = quality
+        self.workers = workers
+        self.log = log
+        self.pool: ProcessPoolExecutor | None = None
+        # 进程池第一次用到时才创建；多个线程同时导出时只能创建一个
+        self.pool_lock = threading.Lock()
+
+    def path_for(self, image_path: str | Path, fmt: str | None = None) -> Path:
+        return thumbnail_path(self.image_root, image_path, fmt or self.fmt)
+
+    def generate(self, image_paths: Iterable[str], fmt: str | None = None) -> dict[str, str]:
+        # 并行生成一批缩略图，返回 原图路径 → 缩略图路径；失败的原图不在结果中
+        fmt = fmt or self.fmt
+        pending = {}
+        for image_path in dict.fromkeys(image_paths):
+            dst = str(self.path_for(image_path, fmt))
+            pending[image_path] = self.executor().submit(make_thumbnail, image_path, dst, self.size, fmt, self.quality)
+
+        thumbs: dict[str, str] = {}
+        for image_path, future in pending.items():
+            try:
+                thumbs[image_path] = future.result()
+            except Exception as exc:  # noqa: BLE001
+                self.log(f"❌ 缩略图生成失败: {image_path}, 错误: {exc}")
+        return thumbs
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def close(self) -> None:
+        with self.pool_lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def build_webp_variants(
+    image_root: str | Path, quality: int = 80, workers: int | None = None, log: Callable[[str], None] = print
+) -> int:
+    # 为图片根目录下的原图和缩略图预先生成同尺寸的 WebP 版本，返回成功的数量；未变化的文件直接复用
+    image_root = Path(image_root)
+    sources = [
+        path
+        for path in image_root.rglob("*")
+        if path.suffix.lower() in IMAGE_SUFFIXES
+        and path.is_file()
+        and path.relative_to(image_root).parts[0] not in (WEBP_DIR, "_objects")
+    ]
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                make_thumbnail,
+                str(path),
+                str(webp_variant_path(image_root, path.relative_to(image_root))),
+                0,
+                "webp",
+                quality,
+            ): path
+            for path in sources
+        }
+        for future, path in futures.items():
+            try:
+                future.result()
+                done += 1
+            except Exception as exc:  # noqa: BLE001
+                log(f"❌ WebP 生成失败: {path}, 错误: {exc}")
+    return done
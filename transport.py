@@ -0,0 +1,174 @@
+import random
+import time
+from typing import Callable, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+from metrics import METRICS, CounterMetric, logger
+from ratelimit import HostRateLimiter, parse_retry_after
+
+# 这些状态码和网络异常视为暂时性错误，按指数退避重试，不直接放弃整个帖子
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+# 每个 Session 最多为多少个主机保留连接池，超出后最久未用的主机连接会被关闭
+POOL_HOSTS = 16
+POOLS = ("page", "image")
+T = TypeVar("T")
+# 第 n 次重试前最多等待 BACKOFF_BASE * 2^n 秒，单次等待不超过 BACKOFF_MAX
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+
+def pool_for(url_class: str) -> str:
+    # 列表页、帖子页走站点主机的连接池，图片走图片 CDN 的连接池，互不抢占空闲连接
+    return "image" if url_class == "image" else "page"
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float | None = None) -> float:
+    # 指数退避加全抖动：在 0 ~ base*2^attempt 之间随机，避免大量线程同时重试；服务器给了 Retry-After 时不早于它
+    delay = random.uniform(0, min(cap, base * 2**attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+
+class RetryPolicy:
+    # 线程版传输层和异步引擎共用的重试策略：哪些错误可以重试、最多几次、每次等多久
+    def __init__(self, retries: int = 3, backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX) -> None:
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def should_retry(self, attempt: int, status: int | None = None) -> bool:
+        # attempt 为已重试次数；status 为 None 表示网络异常，调用方已确认属于暂时性异常
+        return attempt < self.retries and (status is None or status in RETRY_STATUSES)
+
+    def delay(self, attempt: int, url: str, url_class: str, error: str, retry_after: str | None = None) -> float:
+        # 返回第 attempt 次重试前应等待的秒数，同时记录重试次数
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max, parse_retry_after(retry_after))
+        count_retries(url_class).inc()
+        logger.debug("第 %d 次重试 %s（%.2f 秒后）：%s", attempt, url, delay, error)
+        return delay
+
+
+def count_requests(pool: str) -> CounterMetric:
+    return METRICS.counter("crawler_http_requests_total", "发出的 HTTP 请求数（含重试）", pool=pool)
+
+
+def count_connections(pool: str) -> CounterMetric:
+    return METRICS.counter("crawler_http_connections_total", "新建的 TCP 连接数", pool=pool)
+
+
+def count_retries(url_class: str) -> CounterMetric:
+    return METRICS.counter("crawler_http_retries_total", "暂时性错误后的重试次数", kind=url_class)
+
+
+def connection_summary() -> str:
+    # 复用数 = 请求数 - 新建连接数
+    parts = []
+    for pool in POOLS:
+        requests_sent = int(count_requests(pool).snapshot())
+        opened = int(count_connections(pool).snapshot())
+        if requests_sent:
+            parts.append(f"{pool} 请求 {requests_sent} 次，新建连接 {opened}，复用 {max(0, requests_sent - opened)}")
+    return "🔌 连接：" + ("；".join(parts) if parts else "没有发出请求")
+
+
+def counting_pool_class(base: type[HTTPConnectionPool], counter: CounterMetric) -> type[HTTPConnectionPool]:
+    # 连接对象每次真正建立 TCP 连接（包括被服务器关闭后重连）都会调用 connect
+    class CountingConnection(base.ConnectionCls):
+        def connect(self) -> None:
+            counter.inc()
+            super().connect()
+
+    return type(base.__name__, (base,), {"ConnectionCls": CountingConnection})
+
+
+class CountingAdapter(HTTPAdapter):
+    def __init__(self, pool: str, **kwargs) -> None:
+        self.pool_classes = {
+            "http": counting_pool_class(HTTPConnectionPool, count_connections(pool)),
+            "https": counting_pool_class(HTTPSConnectionPool, count_connections(pool)),
+        }
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = self.pool_classes
+        return manager
+
+
+class Transport:
+    # 爬虫的 HTTP 传输层：页面和图片各用一个 Session，每个主机保留的长连接数跟随并发配置，
+    # 避免 “connection pool is full, discarding connection” 后反复握手；
+    # 所有请求经过按主机的令牌桶，超时、断连和 429/5xx 按指数退避加抖动重试
+    def __init__(
+        self,
+        rate_limiter: HostRateLimiter,
+        headers: dict[str, str],
+        timeout: tuple[int, int],
+        page_pool_size: int,
+        image_pool_size: int,
+        retries: int = 3,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+    ) -> None:
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.retry = RetryPolicy(retries, backoff_base, backoff_max)
+        self.sessions = {
+            "page": self.build_session("page", headers, page_pool_size),
+            "image": self.build_session("image", headers, image_pool_size),
+        }
+
+    @staticmethod
+    def build_session(pool: str, headers: dict[str, str], pool_size: int) -> requests.Session:
+        session = requests.Session()
+        session.headers.update(headers)
+        # pool_maxsize 是每个主机保留的空闲连接数，小于并发数时多出的连接用完即关
+        adapter = CountingAdapter(pool, pool_connections=POOL_HOSTS, pool_maxsize=max(1, pool_size), max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get(self, url: str, url_class: str, **kwargs) -> requests.Response:
+        # 非流式请求，返回时正文已经读完
+        return self.request(url, url_class, None, **kwargs)
+
+    def request(self, url: str, url_class: str, read: Callable[[requests.Response], T] | None, **kwargs) -> T:
+        # read 不为 None 时流式打开响应，在重试循环内读取正文后关闭连接并返回 read 的结果；
+        # 读取中途超时或断开会整体重试，read 负责丢弃这次尝试写了一半的内容
+        pool = pool_for(url_class)
+        session = self.sessions[pool]
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(url)
+            count_requests(pool).inc()
+            retry_after = None
+            try:
+                response = session.get(url, timeout=self.timeout, stream=read is not None, **kwargs)
+                with response:
+                    # 429/503 时令牌桶同时暂停该主机，其他线程也会等待
+                    self.rate_limiter.observe(url, response.status_code, response.headers.get("Retry-After"))
+                    if not self.retry.should_retry(attempt, response.status_code):
+                        response.raise_for_status()
+                        return response if read is None else read(response)
+                    error = f"HTTP {response.status_code}"
+                    retry_after = response.headers.get("Retry-After")
+            except RETRY_EXCEPTIONS as exc:
+                if not self.retry.should_retry(attempt):
+                    raise
+                error = str(exc)
+
+            attempt += 1
+            time.sleep(self.retry.delay(attempt, url, url_class, error, retry_after))
+
+    def close(self) -> None:
+        for session in self.sessions.values():
+            session.close()